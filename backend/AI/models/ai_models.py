@@ -1,31 +1,73 @@
 # In AI/models/ai_models.py
 
-from sqlalchemy import Column, ForeignKey, text, TIMESTAMP
+from sqlalchemy import Column, ForeignKey, Integer, String, UniqueConstraint, text, TIMESTAMP
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.core.database import Base
 
 class AIChatHistory(Base):
     # Fill in the blank below with the correct table name
     __tablename__ = "ai_chat_histories"
+    # One conversation per user and medicine
+    __table_args__ = (UniqueConstraint("user_id", "medicine_id", name="uq_ai_chat_histories_user_id_medicine_id"),)
 
     history_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("profiles.id"), nullable=False)
     medicine_id = Column(UUID(as_uuid=True), ForeignKey("medicines.medicine_id"), nullable=False)
-    history = Column(JSONB, nullable=False)
+    # Legacy full-history blob; messages now live in chat_messages
+    history = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    # Number of rows in chat_messages, also used to hand out sequence numbers
+    message_count = Column(Integer, nullable=False, server_default=text('0'))
+    # Running summary of the older messages that no longer fit the context window
+    summary = Column(String)
+    summarized_count = Column(Integer, nullable=False, server_default=text('0'))
+    summarized_tokens = Column(Integer, nullable=False, server_default=text('0'))
     created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
     updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), onupdate=text('now()'))
     
 
 class GeneralChatHistory(Base):
     __tablename__ = "general_chat_histories"
+    # One general conversation per user
+    __table_args__ = (UniqueConstraint("user_id", name="uq_general_chat_histories_user_id"),)
 
     history_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     
     # Link to the user, but not to any specific medicine
     user_id = Column(UUID(as_uuid=True), ForeignKey("profiles.id"), nullable=False)
     
-    # The full conversation history as JSON
-    history = Column(JSONB, nullable=False)
+    # Legacy full-history blob; messages now live in chat_messages
+    history = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    # Number of rows in chat_messages, also used to hand out sequence numbers
+    message_count = Column(Integer, nullable=False, server_default=text('0'))
+    # Running summary of the older messages that no longer fit the context window
+    summary = Column(String)
+    summarized_count = Column(Integer, nullable=False, server_default=text('0'))
+    summarized_tokens = Column(Integer, nullable=False, server_default=text('0'))
     
     created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
-    updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), onupdate=text('now()'))
\ No newline at end of file
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'), onupdate=text('now()'))
+
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    # The history_id of the AIChatHistory or GeneralChatHistory row the message belongs to
+    conversation_id = Column(UUID(as_uuid=True), primary_key=True)
+    # Position of the message within its conversation, starting at 0
+    seq = Column(Integer, primary_key=True)
+
+    role = Column(String, nullable=False) # 'user' or 'model'
+    parts = Column(JSONB, nullable=False)
+
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
+
+
+class OcrAnalysisCache(Base):
+    __tablename__ = "ocr_analysis_cache"
+
+    # SHA-256 of the normalized OCR text
+    text_hash = Column(String, primary_key=True)
+    result = Column(JSONB, nullable=False) # The {"name", "description"} analysis
+    hit_count = Column(Integer, nullable=False, server_default=text('0'))
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
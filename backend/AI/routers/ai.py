@@ -1,135 +1,140 @@
 # In AI/routers/ai.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import json
 import uuid
 
 # Import dependencies from the 'app' module
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 from app.api.v1.models import medicine_models
 
 # Import local modules from the 'AI' module
 from AI.models import ai_models
 from AI.schemas import ai_schemas
-from AI.services import ai_services
+from AI.services import ai_services, chat_history_services, context_services, medicine_context
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/chat/{medicine_id}", response_model=ai_schemas.ChatHistoryResponse)
-def get_chat_history(
+async def get_chat_history(
     medicine_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Retrieves the chat history for a specific medicine for the authenticated user.
+    Returns the newest `limit` messages (older than `before`, if given), oldest first;
+    `next_before` is the cursor for the next older page.
     """
-    chat_history_db = db.query(ai_models.AIChatHistory).filter(
+    chat_history_db = await db.scalar(select(ai_models.AIChatHistory).where(
         ai_models.AIChatHistory.user_id == current_user.user_id,
         ai_models.AIChatHistory.medicine_id == medicine_id
-    ).first()
+    ))
 
     if not chat_history_db:
         return ai_schemas.ChatHistoryResponse(history=[])
     
-    return ai_schemas.ChatHistoryResponse(history=chat_history_db.history)
+    history, next_before = await chat_history_services.load_history_page(db, chat_history_db, limit, before)
+    return ai_schemas.ChatHistoryResponse(history=history, next_before=next_before)
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Formats a payload as a single Server-Sent Event."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
 
 @router.post("/chat", response_model=ai_schemas.ChatResponse)
 async def chat_with_ai(
     chat_request: ai_schemas.ChatRequest,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
-    Handles a streaming chat request for a specific medicine.
+    Handles a chat request for a specific medicine.
+    With `stream` set, the reply is sent as Server-Sent Events: one `data: {"text": ...}`
+    event per chunk, then an `event: done` (or `event: error`) event.
     """
-    medicine = db.query(medicine_models.Medicine).filter(medicine_models.Medicine.medicine_id == chat_request.medicine_id).first()
-    print(medicine.generic_name)
+    medicine = await db.scalar(select(medicine_models.Medicine).where(medicine_models.Medicine.medicine_id == chat_request.medicine_id))
     if not medicine:
         raise HTTPException(status_code=404, detail="Medicine not found.")
 
-    chat_history_db = db.query(ai_models.AIChatHistory).filter(
-        ai_models.AIChatHistory.user_id == current_user.user_id,
-        ai_models.AIChatHistory.medicine_id == chat_request.medicine_id
-    ).first()
-
-    history = []
-    if chat_history_db:
-        history = chat_history_db.history
-    else:
-        initial_prompt = f"You are a helpful and friendly medical assistant. Explain things simply and clearly. The user wants to ask questions about the medicine: {medicine.name}. Do not give medical advice, but provide helpful, factual information."
-        history.append({'role': 'user', 'parts': [{'text': initial_prompt}]})
-        history.append({'role': 'model', 'parts': [{'text': f"Of course! I can provide information about {medicine.name}. What would you like to know?"}]})
-
-    convo = ai_services.start_chat_session(history)
-
-    async def stream_generator():
-        full_response = ""
-        # This function is not implemented in the current ai_services.py, so this will fail
-        # We need to decide if we are streaming or not. For now, let's use the non-streaming version.
-        # for chunk in ai_services.send_message_to_ai_stream(convo, chat_request.prompt):
-        #     full_response += chunk
-        #     yield chunk
-        
-        # Using the non-streaming version for now
-        full_response = ai_services.send_message_to_ai(convo, chat_request.prompt)
-        yield full_response
-
-        # After the stream is complete, save the full history
-        updated_history_list = [
-            {'role': part.role, 'parts': [{'text': p.text} for p in part.parts]}
-            for part in convo.history
-        ]
-        
-        if chat_history_db:
-            chat_history_db.history = updated_history_list
-        else:
-            new_history_record = ai_models.AIChatHistory(
-                user_id=current_user.user_id,
-                medicine_id=chat_request.medicine_id,
-                history=updated_history_list
-            )
-            db.add(new_history_record)
-        
-        db.commit()
-
-    # If we decide to stream, we return StreamingResponse. For now, let's return a normal response.
-    # return StreamingResponse(stream_generator(), media_type="text/plain")
-    
-    # For now, let's make the non-streaming version work correctly.
-    ai_response_text = ai_services.send_message_to_ai(convo, chat_request.prompt)
-    
-    updated_history_list = [
-        {'role': part.role, 'parts': [{'text': p.text} for p in part.parts]}
-        for part in convo.history
-    ]
-    
-    if chat_history_db:
-        chat_history_db.history = updated_history_list
-    else:
-        new_history_record = ai_models.AIChatHistory(
-            user_id=current_user.user_id,
-            medicine_id=chat_request.medicine_id,
-            history=updated_history_list
+    # A new chat is stored with its initial prompt right away, so a second message finds it
+    initial_prompt = f"You are a helpful and friendly medical assistant. Explain things simply and clearly. The user wants to ask questions about the medicine: {medicine.name}. Do not give medical advice, but provide helpful, factual information."
+    chat_history_db = await chat_history_services.get_or_create_conversation(
+        db,
+        ai_models.AIChatHistory,
+        [
+            {'role': 'user', 'parts': [{'text': initial_prompt}]},
+            {'role': 'model', 'parts': [{'text': f"Of course! I can provide information about {medicine.name}. What would you like to know?"}]},
+        ],
+        user_id=current_user.user_id,
+        medicine_id=chat_request.medicine_id
+    )
+
+    # Only the recent messages are sent verbatim; older ones come from the running summary
+    context = await context_services.build_context(db, chat_history_db)
+    history = context.messages
+    tokens_saved = context.tokens_saved
+
+    # The medicine's monograph is rendered once and shared by every chat about it
+    convo = ai_services.start_chat_session(history, prefix=medicine_context.get_prompt_prefix(medicine))
+    history_id = chat_history_db.history_id
+
+    async def save_turn():
+        # Only this turn's messages are written
+        new_messages = chat_history_services.history_to_list(convo)[len(history):]
+        await chat_history_services.save_turn(ai_models.AIChatHistory, history_id, new_messages)
+        # Fold the messages that slid out of the context window into the summary
+        await context_services.refresh_summary(ai_models.AIChatHistory, history_id)
+
+    context_headers = {"X-Context-Tokens-Saved": str(tokens_saved)}
+
+    if chat_request.stream:
+        stream_completed = False
+
+        async def stream_generator():
+            nonlocal stream_completed
+            try:
+                async for chunk in ai_services.send_message_to_ai_stream(convo, chat_request.prompt):
+                    yield _sse_event({"text": chunk})
+            except Exception as e:
+                yield _sse_event({"detail": f"AI chat failed: {e}"}, event="error")
+                return
+
+            stream_completed = True
+            yield _sse_event({}, event="done")
+
+        async def save_completed_turn():
+            # After the stream has ended, save the new messages
+            if stream_completed:
+                await save_turn()
+
+        return StreamingResponse(
+            stream_generator(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **context_headers},
+            background=BackgroundTask(save_completed_turn)
         )
-        db.add(new_history_record)
-    
-    db.commit()
-    
+
+    ai_response_text = await ai_services.send_message_to_ai(convo, chat_request.prompt)
+    # The history is written after the response has been sent
+    background_tasks.add_task(save_turn)
+    response.headers.update(context_headers)
+
     return ai_schemas.ChatResponse(response=ai_response_text)
 
 
 @router.post("/ocr-analyze", response_model=ai_schemas.OcrResponse)
-def analyze_medicine_from_ocr(
+async def analyze_medicine_from_ocr(
     ocr_request: ai_schemas.OcrRequest,
     current_user: TokenData = Depends(get_current_user)
 ):
@@ -137,7 +142,33 @@ def analyze_medicine_from_ocr(
     Receives raw OCR text and uses AI to extract the medicine name and description.
     """
     try:
-        analysis_result = ai_services.analyze_ocr_text(ocr_request.text)
+        analysis_result = await ai_services.analyze_ocr_text(ocr_request.text)
         return analysis_result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI analysis failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"AI analysis failed: {e}")
+
+
+@router.post("/ocr-analyze/batch", response_model=ai_schemas.OcrBatchResponse)
+async def analyze_medicines_from_ocr_batch(
+    batch_request: ai_schemas.OcrBatchRequest,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Analyzes many OCR texts at once (e.g. a whole drawer of medicine boxes),
+    packing them into as few AI calls as possible. Items that fail carry an
+    `error` instead of failing the whole batch.
+    """
+    analysis_results = await ai_services.analyze_ocr_texts([item.text for item in batch_request.items])
+
+    results = []
+    for analysis_result in analysis_results:
+        if isinstance(analysis_result, Exception):
+            results.append(ai_schemas.OcrBatchItemResult(error=f"AI analysis failed: {analysis_result}"))
+        elif ai_services.is_ocr_result(analysis_result):
+            results.append(ai_schemas.OcrBatchItemResult(
+                name=analysis_result["name"],
+                description=analysis_result["description"]
+            ))
+        else:
+            results.append(ai_schemas.OcrBatchItemResult(error="AI analysis returned an unexpected result."))
+    return ai_schemas.OcrBatchResponse(results=results)
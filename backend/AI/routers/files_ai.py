@@ -1,88 +1,86 @@
 # In AI/routers/files_ai.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.concurrency import run_in_threadpool
+import os
 import uuid
 
 # --- THE FIX IS HERE ---
 # Import dependencies from the 'app' module, where they actually live
-from app.core.database import SessionLocal
+from app.core.database import get_db
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 from app.api.v1.models import file_models
 from app.api.v1.schemas import file_schemas # Correct import path
 
 # Import local modules from the 'AI' module
 from AI.schemas import ai_schemas
-from AI.services import ai_services
+from AI.services import ai_services, document_index, document_store, file_jobs
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Number of document passages sent with each question about a file
+FILE_CHAT_TOP_K = int(os.getenv("FILE_CHAT_TOP_K", "4"))
 
-@router.post("/process-file", response_model=file_schemas.FileProcessResponse)
-def process_file(
+@router.post("/process-file", response_model=file_schemas.FileJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def process_file(
     file_data: file_schemas.FileProcessRequest,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
-    Processes an uploaded file. Checks if the file has been seen before using its hash.
-    If it's a new file, it extracts and saves the text content.
+    Queues an uploaded file for processing and returns the job to poll (202).
+    If the user already processed a file with the same hash, its saved text is
+    returned right away instead (200, with status 'succeeded' and no job).
     """
-    # 1. Check if a file with this hash already exists
-    existing_file = db.query(file_models.File).filter(file_models.File.file_hash == file_data.file_hash).first()
-
-    if existing_file:
-        print(f"File with hash {file_data.file_hash} already exists. Returning cached text.")
-        return file_schemas.FileProcessResponse(
-            file_id=existing_file.file_id,
-            extracted_text=existing_file.extracted_text
-        )
+    processed = await file_jobs.find_processed(db, file_data, current_user.user_id)
+    if processed:
+        response.status_code = status.HTTP_200_OK
+        return processed
 
-    # 2. If it's a new file, download it from Supabase Storage
-    try:
-        file_content = ai_services.download_file_content(file_data.file_url)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to download file: {e}")
-
-    # 3. Extract the text from the file content
-    extracted_text = ai_services.extract_text_from_file(file_content, file_data.file_type)
-
-    # 4. Create a new file record in the database with the hash and extracted text
-    new_file = file_models.File(
-        user_id=current_user.user_id,
-        file_url=file_data.file_url,
-        file_hash=file_data.file_hash,
-        file_type=file_data.file_type,
-        description=file_data.description,
-        extracted_text=extracted_text
-    )
-    db.add(new_file)
-    db.commit()
-    db.refresh(new_file)
+    job = await file_jobs.create_job(db, file_data, current_user.user_id)
+    file_jobs.enqueue(job.job_id)
+    return await file_jobs.job_response(db, job)
 
-    return file_schemas.FileProcessResponse(
-        file_id=new_file.file_id,
-        extracted_text=new_file.extracted_text
-    )
+
+@router.get("/jobs/{job_id}", response_model=file_schemas.FileJobResponse)
+async def get_file_job(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Returns the status of a file processing job: queued, running (with its
+    current stage), failed (with the error) or succeeded (with the result).
+    """
+    job = await db.scalar(select(file_models.FileJob).where(file_models.FileJob.job_id == job_id))
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.user_id != uuid.UUID(current_user.user_id):
+        raise HTTPException(status_code=403, detail="Not authorized to access this job.")
+
+    return await file_jobs.job_response(db, job)
 
 
 @router.post("/chat-with-file", response_model=ai_schemas.ChatResponse)
-def chat_with_file(
+async def chat_with_file(
     chat_request: file_schemas.FileChatRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Allows a user to ask a question about a previously processed file.
     """
     # 1. Find the file record in our database
-    file_record = db.query(file_models.File).filter(file_models.File.file_id == chat_request.file_id).first()
+    file_record = await db.scalar(
+        select(file_models.File)
+        .options(selectinload(file_models.File.document))
+        .where(file_models.File.file_id == chat_request.file_id)
+    )
 
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found.")
@@ -91,10 +89,22 @@ def chat_with_file(
     if file_record.user_id != uuid.UUID(current_user.user_id):
         raise HTTPException(status_code=403, detail="Not authorized to access this file.")
 
-    # 3. Use the AI service to answer the question based on the stored text
+    # 3. Pick the passages most relevant to the question. Documents stored before
+    #    indexing existed get their index built (and saved) on first use.
+    document = file_record.document
+    document_text = document_store.load_text(document)
+    text_index = document.text_index if document else None
+    if text_index is None:
+        text_index = await run_in_threadpool(document_index.build_index, document_text)
+        if document is not None:
+            document.text_index = text_index
+            await db.commit()
+    passages = document_index.top_passages(text_index, document_text, chat_request.prompt, FILE_CHAT_TOP_K)
+
+    # 4. Use the AI service to answer the question based on those passages only
     try:
-        ai_response = ai_services.chat_about_document(
-            document_text=file_record.extracted_text,
+        ai_response = await ai_services.chat_about_document(
+            passages=passages,
             prompt=chat_request.prompt
         )
         return ai_schemas.ChatResponse(response=ai_response)
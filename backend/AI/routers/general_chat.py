@@ -1,97 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import uuid
 
 # Import dependencies from the 'app' module
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 
 # Import local modules from the 'AI' module
 from AI.models import ai_models
 from AI.schemas import ai_schemas
-from AI.services import ai_services
+from AI.services import ai_services, chat_history_services, context_services
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=ai_schemas.ChatHistoryResponse)
-def get_general_chat_history(
-    db: Session = Depends(get_db),
+async def get_general_chat_history(
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Retrieves the general chat history for the authenticated user.
+    Returns the newest `limit` messages (older than `before`, if given), oldest first;
+    `next_before` is the cursor for the next older page.
     """
-    chat_history_db = db.query(ai_models.GeneralChatHistory).filter(
+    chat_history_db = await db.scalar(select(ai_models.GeneralChatHistory).where(
         ai_models.GeneralChatHistory.user_id == current_user.user_id
-    ).first()
+    ))
 
     if not chat_history_db:
         # Return an empty history if no conversation has started
         return ai_schemas.ChatHistoryResponse(history=[])
     
-    return ai_schemas.ChatHistoryResponse(history=chat_history_db.history)
+    history, next_before = await chat_history_services.load_history_page(db, chat_history_db, limit, before)
+    return ai_schemas.ChatHistoryResponse(history=history, next_before=next_before)
 
 @router.post("/", response_model=ai_schemas.ChatResponse)
 async def chat_with_ai_general(
     chat_request: ai_schemas.GeneralChatRequest,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Handles a chat request for the general-purpose medical AI.
     """
     
-    # 1. Find the user's existing chat history
-    chat_history_db = db.query(ai_models.GeneralChatHistory).filter(
-        ai_models.GeneralChatHistory.user_id == current_user.user_id
-    ).first()
+    # 1. Find the user's conversation, storing a new one with its initial prompt
+    #    right away so that a second message finds it
+    initial_prompt = (
+        "You are Medi Qube, a helpful and friendly medical AI assistant. "
+        "Explain things simply and clearly. Users will ask you general "
+        "questions about medicines, diseases, and health. Do not give "
+        "personal medical advice, but provide helpful, factual information."
+    )
+    chat_history_db = await chat_history_services.get_or_create_conversation(
+        db,
+        ai_models.GeneralChatHistory,
+        [
+            {'role': 'user', 'parts': [{'text': initial_prompt}]},
+            {'role': 'model', 'parts': [{'text': "Of course! I'm here to help. What would you like to know?"}]},
+        ],
+        user_id=current_user.user_id
+    )
 
-    history = []
-    if chat_history_db:
-        history = chat_history_db.history
-    else:
-        # 2. If no history, create the initial prompt
-        initial_prompt = (
-            "You are Medi Qube, a helpful and friendly medical AI assistant. "
-            "Explain things simply and clearly. Users will ask you general "
-            "questions about medicines, diseases, and health. Do not give "
-            "personal medical advice, but provide helpful, factual information."
-        )
-        history.append({'role': 'user', 'parts': [{'text': initial_prompt}]})
-        history.append({'role': 'model', 'parts': [{'text': "Of course! I'm here to help. What would you like to know?"}]})
+    # 2. Only the recent messages are sent verbatim; older ones come from the running summary
+    context = await context_services.build_context(db, chat_history_db)
+    history = context.messages
+    tokens_saved = context.tokens_saved
 
     # 3. Start the chat session with the loaded history
     convo = ai_services.start_chat_session(history)
 
     # 4. Send the new prompt to the AI
-    ai_response_text = ai_services.send_message_to_ai(convo, chat_request.prompt)
-    
-    # 5. Get the complete, updated history from the AI service
-    updated_history_list = [
-        {'role': part.role, 'parts': [{'text': p.text} for p in part.parts]}
-        for part in convo.history
-    ]
-    
-    # 6. Save the updated history back to the database
-    if chat_history_db:
-        # Update existing record
-        chat_history_db.history = updated_history_list
-    else:
-        # Create a new record
-        new_history_record = ai_models.GeneralChatHistory(
-            user_id=current_user.user_id,
-            history=updated_history_list
-        )
-        db.add(new_history_record)
-    
-    db.commit()
+    ai_response_text = await ai_services.send_message_to_ai(convo, chat_request.prompt)
     
+    # 5. Take only this turn's messages
+    new_messages = chat_history_services.history_to_list(convo)[len(history):]
+    history_id = chat_history_db.history_id
+
+    # 6. Once the response has been sent, append them to the conversation and
+    #    fold the messages that slid out of the context window into the summary
+    async def save_turn():
+        await chat_history_services.save_turn(ai_models.GeneralChatHistory, history_id, new_messages)
+        await context_services.refresh_summary(ai_models.GeneralChatHistory, history_id)
+
+    background_tasks.add_task(save_turn)
+    response.headers["X-Context-Tokens-Saved"] = str(tokens_saved)
+
     # 7. Return just the AI's last response
     return ai_schemas.ChatResponse(response=ai_response_text)
\ No newline at end of file
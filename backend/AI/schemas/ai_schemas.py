@@ -1,13 +1,15 @@
 # In AI/schemas/ai_schemas.py
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import uuid
 
 # --- Schemas for sending a chat message ---
 class ChatRequest(BaseModel):
     medicine_id: uuid.UUID
     prompt: str
+    # When true, the reply is sent as Server-Sent Events while it is generated
+    stream: bool = False
 
 class ChatResponse(BaseModel):
     response: str
@@ -19,9 +21,13 @@ class ChatMessagePart(BaseModel):
 class ChatMessage(BaseModel):
     role: str
     parts: List[ChatMessagePart]
+    # Position in the conversation, usable as the `before` cursor
+    seq: Optional[int] = None
 
 class ChatHistoryResponse(BaseModel):
     history: List[ChatMessage]
+    # Pass as `before` to fetch the next older page; None when there is none
+    next_before: Optional[int] = None
 
 # --- Schemas for OCR analysis ---
 class OcrRequest(BaseModel):
@@ -30,6 +36,19 @@ class OcrRequest(BaseModel):
 class OcrResponse(BaseModel):
     name: str
     description: str
+
+class OcrBatchRequest(BaseModel):
+    items: List[OcrRequest] = Field(..., min_length=1, max_length=50)
+
+# One result per request item, in the same order; `error` is set instead of
+# name/description when that item could not be analyzed
+class OcrBatchItemResult(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    error: Optional[str] = None
+
+class OcrBatchResponse(BaseModel):
+    results: List[OcrBatchItemResult]
     
 # --- Schemas for General Chat ---
 
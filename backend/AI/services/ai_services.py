@@ -1,46 +1,91 @@
 # In AI/services/ai_services.py
 import os
+import io
 import json
-import httpx
-import google.generativeai as genai
+import mmap
+import asyncio
+import hashlib
+import tempfile
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from app.core import http_client
+from app.core.singleflight import SingleFlight
+from AI.services import catalog_matcher, ocr_cache, text_extraction
+from AI.services.llm_providers import get_provider
+
 load_dotenv()
 
-# Ensure your GOOGLE_API_KEY is in the .env file
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Configuration for the OCR analysis (JSON output)
-json_generation_config = {
-  "temperature": 0.2,
-  "top_p": 1,
-  "top_k": 1,
-  "max_output_tokens": 2048,
-  "response_mime_type": "application/json",
-}
-
-# Configuration for the chat (text output)
-chat_generation_config = {
-  "temperature": 0.9,
-  "top_p": 1,
-  "top_k": 1,
-  "max_output_tokens": 2048,
-}
-
-# Initialize the model for OCR/JSON tasks
-json_model = genai.GenerativeModel(
-    model_name="gemini-2.5-flash",
-    generation_config=json_generation_config
-)
-
-# Initialize the model for chat tasks
-chat_model = genai.GenerativeModel(
-    model_name="gemini-2.5-flash",
-    generation_config=chat_generation_config
-)
-
-
-def analyze_ocr_text(text: str) -> dict:
+# Upper bound on LLM calls in flight per worker process. Every call below is
+# awaited natively, so waiting calls cost a coroutine rather than a thread.
+AI_MAX_CONCURRENT_REQUESTS = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "32"))
+_ai_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENT_REQUESTS)
+
+_ocr_flight = SingleFlight("ocr_analysis")
+
+
+# Batch OCR analysis packs several texts into one call, up to this many
+# estimated prompt tokens or items, whichever comes first
+OCR_BATCH_TOKEN_BUDGET = int(os.getenv("OCR_BATCH_TOKEN_BUDGET", "6000"))
+OCR_BATCH_MAX_ITEMS = int(os.getenv("OCR_BATCH_MAX_ITEMS", "20"))
+
+# Downloads larger than this are rejected; above the spool size they are kept on disk
+FILE_DOWNLOAD_MAX_BYTES = int(os.getenv("FILE_DOWNLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+FILE_DOWNLOAD_SPOOL_BYTES = int(os.getenv("FILE_DOWNLOAD_SPOOL_BYTES", str(4 * 1024 * 1024)))
+FILE_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+def is_ocr_result(result) -> bool:
+    return isinstance(result, dict) and isinstance(result.get("name"), str) and isinstance(result.get("description"), str)
+
+
+def _parse_json(text: str):
+    cleaned_text = text.strip().strip("`").strip()
+    if cleaned_text.startswith("json"):
+        cleaned_text = cleaned_text[4:].strip()
+    return json.loads(cleaned_text)
+
+
+async def _find_known_ocr_result(text: str):
+    """
+    Answers OCR text without the AI when possible: medicines in our catalog are
+    matched locally and repeat scans of the same packaging come from the OCR cache.
+    Returns (result or None, cache key).
+    """
+    catalog_match = await catalog_matcher.match(text)
+    if catalog_match is not None:
+        return catalog_match, None
+
+    key = ocr_cache.cache_key(text)
+    if key is not None:
+        cached = await ocr_cache.lookup(key)
+        if cached is not None:
+            return cached, key
+    return None, key
+
+
+async def analyze_ocr_text(text: str) -> dict:
+    """
+    Finds the trade name and a description in OCR text, asking the AI only
+    when the catalog and the OCR cache cannot answer.
+    """
+    result, key = await _find_known_ocr_result(text)
+    if result is not None:
+        return result
+
+    # Identical texts arriving at the same time share one AI call
+    return await _ocr_flight.do_async(key or text, _analyze_and_cache_ocr_text, text, key)
+
+
+async def _analyze_and_cache_ocr_text(text: str, key) -> dict:
+    result = await _analyze_ocr_text_with_ai(text)
+    # Only well-formed answers are cached, so a bad one is not served again
+    if key is not None and is_ocr_result(result):
+        await ocr_cache.store(key, result)
+    return result
+
+
+async def _analyze_ocr_text_with_ai(text: str) -> dict:
     prompt = f"""
     Analyze the following text from a medicine package.
     Identify the primary trade name and a brief, one-sentence description of its main use.
@@ -52,52 +97,232 @@ def analyze_ocr_text(text: str) -> dict:
     ---
     """
     try:
-        response = json_model.generate_content(prompt)
-        cleaned_text = response.text.strip().strip("`").strip()
-        if cleaned_text.startswith("json"):
-            cleaned_text = cleaned_text[4:].strip()
-        return json.loads(cleaned_text)
+        async with _ai_semaphore:
+            response = await get_provider().generate(prompt, json_mode=True)
+        return _parse_json(response.text)
     except Exception as e:
         raise ValueError(f"Google AI analysis failed: {e}")
 
 
-def start_chat_session(history):
-    """Starts a chat session with the given history."""
-    convo = chat_model.start_chat(history=history)
+def _pack_ocr_batches(texts: list) -> list:
+    """Splits texts into consecutive groups that fit the batch token budget."""
+    batches, batch, batch_tokens = [], [], 0
+    for text in texts:
+        tokens = len(text) // 4 + 10
+        if batch and (batch_tokens + tokens > OCR_BATCH_TOKEN_BUDGET or len(batch) >= OCR_BATCH_MAX_ITEMS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _analyze_ocr_batch_with_ai(texts: list) -> list:
+    """
+    Analyzes several OCR texts in one call. Returns one result per text, with
+    None for texts the answer did not cover with a usable object.
+    """
+    numbered_texts = "\n".join(
+        f"""
+    Text {index}:
+    ---
+    {text}
+    ---"""
+        for index, text in enumerate(texts)
+    )
+    prompt = f"""
+    Analyze each of the following texts from medicine packages.
+    For each text, identify the primary trade name and a brief, one-sentence description of its main use.
+    Return ONLY a raw JSON array with one object per text, each with three keys:
+    "index" (the number of the text), "name" and "description".
+    {numbered_texts}
+    """
+    results = [None] * len(texts)
+    try:
+        async with _ai_semaphore:
+            response = await get_provider().generate(prompt, json_mode=True)
+        parsed = _parse_json(response.text)
+    except Exception:
+        return results
+
+    if not isinstance(parsed, list):
+        return results
+    for item in parsed:
+        index = item.get("index") if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(texts) and is_ocr_result(item):
+            results[index] = {"name": item["name"], "description": item["description"]}
+    return results
+
+
+async def analyze_ocr_texts(texts: list) -> list:
+    """
+    Batch version of analyze_ocr_text. Texts the catalog and cache cannot answer
+    are packed into as few AI calls as the token budget allows; texts missing
+    from a batch answer are retried one by one. Returns, in input order, a result
+    dict or the exception raised for that text.
+    """
+    results = [None] * len(texts)
+    keys = [None] * len(texts)
+    known = await asyncio.gather(*(_find_known_ocr_result(text) for text in texts))
+    for index, (result, key) in enumerate(known):
+        results[index], keys[index] = result, key
+
+    # Identical texts in one batch are only analyzed once
+    pending = {}
+    for index, text in enumerate(texts):
+        if results[index] is None:
+            pending.setdefault(keys[index] or text, []).append(index)
+    unique_texts = [texts[indexes[0]] for indexes in pending.values()]
+
+    batch_results = await asyncio.gather(
+        *(_analyze_ocr_batch_with_ai(batch) for batch in _pack_ocr_batches(unique_texts))
+    )
+    answers = [result for batch in batch_results for result in batch]
+
+    async def retry_alone(text):
+        try:
+            return await _analyze_ocr_text_with_ai(text)
+        except Exception as e:
+            return e
+
+    missing = [position for position, answer in enumerate(answers) if answer is None]
+    retried = await asyncio.gather(*(retry_alone(unique_texts[position]) for position in missing))
+    for position, answer in zip(missing, retried):
+        answers[position] = answer
+
+    for answer, indexes in zip(answers, pending.values()):
+        key = keys[indexes[0]]
+        if key is not None and is_ocr_result(answer):
+            await ocr_cache.store(key, answer)
+        for index in indexes:
+            results[index] = answer
+    return results
+
+
+def start_chat_session(history, prefix=None):
+    """
+    Starts a chat session with the given history. The optional PromptPrefix
+    (e.g. a medicine's monograph) is sent before the history on every message.
+    """
+    convo = get_provider().start_chat(history, prefix)
     return convo
 
-def send_message_to_ai(convo, prompt):
+async def send_message_to_ai(convo, prompt):
     """Sends a new message to the ongoing conversation."""
-    convo.send_message(prompt)
-    return convo.last.text
+    async with _ai_semaphore:
+        response = await convo.send_message(prompt)
+    return response.text
 
-# --- THE MISSING FUNCTION IS HERE ---
-def download_file_content(file_url: str) -> bytes:
-    """Downloads the raw content of a file from a URL."""
-    with httpx.Client() as client:
-        response = client.get(file_url)
-        response.raise_for_status()
-        return response.content
+async def send_message_to_ai_stream(convo, prompt):
+    """
+    Sends a new message and yields the reply text chunk by chunk as it arrives.
+    Once the generator is exhausted, convo.history includes the full reply.
+    """
+    async with _ai_semaphore:
+        async for chunk in convo.send_message_stream(prompt):
+            yield chunk
 
-def extract_text_from_file(file_content: bytes, file_type: str) -> str:
+class FileTooLargeError(ValueError):
+    pass
+
+class DownloadedFile:
+    """
+    The content of a downloaded file, in memory or (above FILE_DOWNLOAD_SPOOL_BYTES)
+    in a temporary file, with the SHA-256 computed from the bytes received.
     """
-    Extracts text from file content.
-    NOTE: This is a placeholder for now.
+
+    def __init__(self, buffer, sha256: str, size: int):
+        self.buffer = buffer
+        self.sha256 = sha256
+        self.size = size
+
+    @property
+    def path(self):
+        """Path of the temporary file holding the content, or None while it is in memory."""
+        return None if isinstance(self.buffer, io.BytesIO) else self.buffer.name
+
+    @contextmanager
+    def open_view(self):
+        """Yields a read-only memoryview of the content, memory-mapped when it is on disk."""
+        if isinstance(self.buffer, io.BytesIO):
+            with self.buffer.getbuffer() as view, view.toreadonly() as readonly:
+                yield readonly
+        elif self.size == 0:
+            yield memoryview(b"")
+        else:
+            with mmap.mmap(self.buffer.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    yield view
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+async def download_file(file_url: str) -> DownloadedFile:
     """
+    Streams a file from a URL over the shared HTTP client, hashing it as the
+    chunks arrive. Small files stay in memory and larger ones are spooled to
+    disk, so peak memory per download is bounded by FILE_DOWNLOAD_SPOOL_BYTES.
+    Raises FileTooLargeError above FILE_DOWNLOAD_MAX_BYTES.
+    """
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    size = 0
     try:
-        return file_content.decode('utf-8')
-    except UnicodeDecodeError:
-        return " [Content is binary and cannot be displayed as simple text] "
+        async with http_client.get_client().stream("GET", file_url) as response:
+            response.raise_for_status()
+            if int(response.headers.get("content-length") or 0) > FILE_DOWNLOAD_MAX_BYTES:
+                raise FileTooLargeError(f"File is larger than {FILE_DOWNLOAD_MAX_BYTES} bytes.")
+            async for chunk in response.aiter_bytes(FILE_DOWNLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > FILE_DOWNLOAD_MAX_BYTES:
+                    raise FileTooLargeError(f"File is larger than {FILE_DOWNLOAD_MAX_BYTES} bytes.")
+                digest.update(chunk)
+                if isinstance(buffer, io.BytesIO) and size > FILE_DOWNLOAD_SPOOL_BYTES:
+                    # Named, so extractor processes can open it
+                    spooled = tempfile.NamedTemporaryFile()
+                    with buffer.getbuffer() as received:
+                        spooled.write(received)
+                    buffer.close()
+                    buffer = spooled
+                buffer.write(chunk)
+        buffer.flush()
+    except BaseException:
+        buffer.close()
+        raise
+    return DownloadedFile(buffer, digest.hexdigest(), size)
 
-def chat_about_document(document_text: str, prompt: str) -> str:
+async def extract_text_from_file(downloaded: DownloadedFile, file_type: str) -> str:
+    """
+    Extracts text from a downloaded file with the extractor registered for its
+    type, in the extraction process pool. Files spooled to disk are passed by
+    path and memory-mapped by the extractor rather than copied.
     """
-    Uses the AI to answer a question based on the provided document text.
+    if downloaded.path is not None:
+        return await text_extraction.extract_text(downloaded.path, file_type)
+    with downloaded.open_view() as file_content:
+        content = bytes(file_content)
+    return await text_extraction.extract_text(content, file_type)
+
+async def chat_about_document(passages: list, prompt: str) -> str:
     """
+    Uses the AI to answer a question based on the passages of a document
+    that are most relevant to it.
+    """
+    document_text = "\n...\n".join(passage.strip() for passage in passages)
     full_prompt = f"""
-    You are a helpful assistant. The user has provided you with the text from a document.
+    You are a helpful assistant. The user has provided you with excerpts from a document,
+    selected as the parts most relevant to their question.
     Answer the user's question based ONLY on the information contained in the provided text.
 
-    Here is the document text:
+    Here are the document excerpts:
     ---
     {document_text}
     ---
@@ -108,7 +333,38 @@ def chat_about_document(document_text: str, prompt: str) -> str:
     ---
     """
     try:
-        response = chat_model.generate_content(full_prompt)
+        async with _ai_semaphore:
+            response = await get_provider().generate(full_prompt)
+        return response.text
+    except Exception as e:
+        raise ValueError(f"Google AI chat failed: {e}")
+
+async def summarize_conversation(previous_summary: str, messages: list) -> str:
+    """
+    Folds older chat messages into a running summary of the conversation.
+    """
+    transcript = "\n".join(
+        f"{message['role']}: {' '.join(part['text'] for part in message['parts'])}"
+        for message in messages
+    )
+    full_prompt = f"""
+    You are maintaining a running summary of a conversation between a user and a medical assistant.
+    Update the summary with the new messages below. Keep every fact, question and answer the
+    assistant may need later, and keep it under 300 words.
+
+    Current summary:
+    ---
+    {previous_summary or "(none yet)"}
+    ---
+
+    New messages:
+    ---
+    {transcript}
+    ---
+    """
+    try:
+        async with _ai_semaphore:
+            response = await get_provider().generate(full_prompt)
         return response.text
     except Exception as e:
-        raise ValueError(f"Google AI chat failed: {e}")
\ No newline at end of file
+        raise ValueError(f"Google AI summary failed: {e}")
@@ -0,0 +1,222 @@
+# In AI/services/catalog_matcher.py
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from sqlalchemy import func, select
+
+from app.core import metrics
+from app.core.database import SessionLocal
+from app.core.singleflight import SingleFlight
+from app.api.v1.models import medicine_models
+from AI.services.ocr_cache import normalize_ocr_text
+
+# The whole catalog is reloaded this often, to pick up changes to it
+CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", "600"))
+# After a failed load, the catalog is not tried again for this long
+CATALOG_RETRY_SECONDS = 30
+# Shorter names match inside too many unrelated words to be trusted
+MIN_PATTERN_LENGTH = 4
+
+_counters = metrics.Counters("matches", "no_match", "ambiguous", "reloads", "reload_errors")
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    name: str
+    usage: str
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over normalized medicine names. Patterns can be added
+    at any time; the failure links are rebuilt lazily before the next scan.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]     # Patterns that end exactly at each node
+        self.output_link = [0] # Nearest node on the failure chain that has output
+        self.patterns = []     # (pattern length, CatalogEntry)
+        self.linked = True
+
+    def add(self, pattern: str, entry: CatalogEntry):
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.output_link.append(0)
+                self.goto[node][char] = next_node
+            node = next_node
+        self.output[node].append(len(self.patterns))
+        self.patterns.append((len(pattern), entry))
+        self.linked = False
+
+    def _link(self):
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            self.output_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                target = self.fail[child]
+                self.output_link[child] = target if self.output[target] else self.output_link[target]
+                queue.append(child)
+        self.linked = True
+
+    def scan(self, text: str):
+        """Yields (start, end, CatalogEntry) for every pattern occurrence in `text`."""
+        if not self.linked:
+            self._link()
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            hit = node if self.output[node] else self.output_link[node]
+            while hit:
+                for pattern_id in self.output[hit]:
+                    length, entry = self.patterns[pattern_id]
+                    yield index - length + 1, index + 1, entry
+                hit = self.output_link[hit]
+
+
+_automaton = _Automaton()
+_lock = threading.Lock()
+_loaded_at = None
+_retry_at = 0.0
+_reload_flight = SingleFlight("catalog_reload")
+_refresh_task = None
+
+
+def _pattern(text: str):
+    normalized = normalize_ocr_text(text or "")
+    if len(normalized) < MIN_PATTERN_LENGTH:
+        return None
+    # Padding with spaces only allows whole-word matches
+    return f" {normalized} "
+
+
+def _add(automaton: _Automaton, medicine):
+    # Only trade names are indexed: a generic name is shared by many products,
+    # so finding one does not tell which medicine the text is about
+    pattern = _pattern(medicine.name)
+    if pattern:
+        automaton.add(pattern, CatalogEntry(name=medicine.name, usage=(medicine.usage or "").strip()))
+
+
+async def reload():
+    """
+    Rebuilds the matcher from the curated catalog: the medicines rows with a
+    usage. Rows users create by typing a name have none; they could never give
+    an answer, only make real matches ambiguous, so they are left out.
+    """
+    global _automaton, _loaded_at
+    async with SessionLocal() as db:
+        medicines = (await db.execute(
+            select(medicine_models.Medicine.name, medicine_models.Medicine.usage)
+            .where(func.trim(medicine_models.Medicine.usage) != "")
+        )).all()
+
+    automaton = _Automaton()
+    for medicine in medicines:
+        _add(automaton, medicine)
+    automaton._link()
+
+    with _lock:
+        _automaton = automaton
+        _loaded_at = time.monotonic()
+    _counters.increment("reloads")
+
+
+async def _try_reload() -> bool:
+    """Reloads the catalog (once for all concurrent callers); returns False if that failed."""
+    global _retry_at
+    try:
+        await _reload_flight.do_async("catalog", reload)
+        return True
+    except Exception as e:
+        _retry_at = time.monotonic() + CATALOG_RETRY_SECONDS
+        _counters.increment("reload_errors")
+        print(f"Could not load the medicine catalog: {e}")
+        return False
+
+
+def _first_sentence(text: str) -> str:
+    sentence = text.split(". ")[0].strip()
+    return sentence if sentence.endswith(".") else f"{sentence}."
+
+
+def _longest(matches: list) -> list:
+    """The matches without those found inside a longer match (e.g. "Crocin" inside "Crocin Advance")."""
+    return [
+        (start, end, entry) for start, end, entry in matches
+        if not any(
+            other_start <= start and end <= other_end and other_end - other_start > end - start
+            for other_start, other_end, _ in matches
+        )
+    ]
+
+
+def _confident_match(matches: list):
+    """
+    Picks the medicine the text is about, or returns None when there is no
+    single medicine to pick (including text that only names generics).
+    """
+    longest = _longest(matches)
+    if not longest:
+        _counters.increment("no_match")
+        return None
+
+    if len({normalize_ocr_text(entry.name) for _, _, entry in longest}) > 1:
+        _counters.increment("ambiguous")
+        return None
+
+    _counters.increment("matches")
+    entry = longest[0][2]
+    return {"name": entry.name, "description": _first_sentence(entry.usage)}
+
+
+async def match(text: str):
+    """
+    Scans OCR text for known medicine names. Returns {"name", "description"}
+    when exactly one catalog medicine is a confident match, otherwise None
+    (also when the catalog cannot be loaded, leaving the text to the AI).
+    """
+    global _refresh_task
+    now = time.monotonic()
+    if _loaded_at is None:
+        # Concurrent requests on a cold matcher wait for one shared load
+        if now < _retry_at or not await _try_reload():
+            return None
+    elif now - _loaded_at > CATALOG_REFRESH_SECONDS and now >= _retry_at and (_refresh_task is None or _refresh_task.done()):
+        # Stale: keep matching against the loaded catalog while it is refreshed
+        _refresh_task = asyncio.ensure_future(_try_reload())
+
+    text = f" {normalize_ocr_text(text)} "
+    with _lock:
+        matches = list(_automaton.scan(text))
+    return _confident_match(matches)
+
+
+def stats() -> dict:
+    values = _counters.as_dict()
+    with _lock:
+        values["patterns"] = len(_automaton.patterns)
+    return values
+
+
+metrics.register("catalog_matcher", stats)
@@ -0,0 +1,141 @@
+# In AI/services/chat_history_services.py
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import SessionLocal
+from AI.models import ai_models
+
+
+def history_to_list(convo):
+    """Returns the AI session history in the JSON shape we store."""
+    return [
+        {'role': message['role'], 'parts': [{'text': part['text']} for part in message['parts']]}
+        for message in convo.history
+    ]
+
+
+async def migrate_legacy_history(db: AsyncSession, conversation):
+    """
+    Moves a conversation still stored as a single JSONB blob into chat_messages.
+    The conditional UPDATE makes sure only one concurrent request does the move.
+    """
+    if conversation.message_count or not conversation.history:
+        return
+
+    model = type(conversation)
+    legacy_history = conversation.history
+    result = await db.execute(
+        update(model)
+        .where(model.history_id == conversation.history_id, model.message_count == 0)
+        .values(message_count=len(legacy_history), history=[])
+    )
+    if result.rowcount == 1:
+        await db.execute(
+            insert(ai_models.ChatMessage)
+            .values([
+                {
+                    'conversation_id': conversation.history_id,
+                    'seq': seq,
+                    'role': message['role'],
+                    'parts': message['parts'],
+                }
+                for seq, message in enumerate(legacy_history)
+            ])
+            .on_conflict_do_nothing()
+        )
+    await db.commit()
+    await db.refresh(conversation)
+
+
+async def get_or_create_conversation(db: AsyncSession, model, initial_messages: list, **owner):
+    """
+    Returns the owner's conversation (e.g. user_id and medicine_id), creating it
+    with its initial messages when there is none. Runs before the reply is
+    sent, so the next message always finds it; the unique constraint on the
+    owner columns makes concurrent first messages share one conversation.
+    """
+    conversation = await db.scalar(select(model).filter_by(**owner))
+    if conversation is not None:
+        return conversation
+
+    history_id = (await db.execute(
+        insert(model)
+        .values(history=[], message_count=len(initial_messages), **owner)
+        .on_conflict_do_nothing(index_elements=list(owner))
+        .returning(model.history_id)
+    )).scalar_one_or_none()
+    if history_id is not None:
+        db.add_all([
+            ai_models.ChatMessage(conversation_id=history_id, seq=seq, role=message['role'], parts=message['parts'])
+            for seq, message in enumerate(initial_messages)
+        ])
+    await db.commit()
+    return await db.scalar(select(model).filter_by(**owner))
+
+
+async def load_history_page(db: AsyncSession, conversation, limit: int, before: int = None):
+    """
+    Returns the newest `limit` messages with a sequence number below `before`
+    (or the newest overall), oldest first, plus the cursor for the next older
+    page (None when there is none). Reads only those rows, backwards along the
+    (conversation_id, seq) primary key. Nothing is written, so `db` may be a
+    read replica session.
+    """
+    if not conversation.message_count and conversation.history:
+        # Not moved to chat_messages yet (the next chat turn does that); page through the blob
+        end = len(conversation.history) if before is None else max(min(before, len(conversation.history)), 0)
+        start = max(end - limit, 0)
+        return [
+            {'seq': seq, 'role': message['role'], 'parts': message['parts']}
+            for seq, message in enumerate(conversation.history[start:end], start)
+        ], start if start > 0 else None
+
+    query = select(ai_models.ChatMessage).where(
+        ai_models.ChatMessage.conversation_id == conversation.history_id
+    )
+    if before is not None:
+        query = query.where(ai_models.ChatMessage.seq < before)
+    messages = (await db.scalars(query.order_by(ai_models.ChatMessage.seq.desc()).limit(limit + 1))).all()
+
+    has_older = len(messages) > limit
+    messages = list(reversed(messages[:limit]))
+    next_before = messages[0].seq if has_older else None
+
+    return [
+        {'seq': message.seq, 'role': message.role, 'parts': message.parts}
+        for message in messages
+    ], next_before
+
+
+async def save_turn(model, conversation_id, new_messages: list):
+    """
+    Appends the messages of one chat turn to a conversation (see
+    get_or_create_conversation). Only the new rows are written, so the cost
+    does not grow with the length of the conversation.
+
+    Runs after the response has been sent, so it opens its own session.
+    """
+    if not new_messages:
+        return
+
+    async with SessionLocal() as db:
+        # Reserve sequence numbers atomically, so concurrent turns never collide
+        message_count = (await db.execute(
+            update(model)
+            .where(model.history_id == conversation_id)
+            .values(message_count=model.message_count + len(new_messages))
+            .returning(model.message_count)
+        )).scalar_one()
+        first_seq = message_count - len(new_messages)
+
+        db.add_all([
+            ai_models.ChatMessage(
+                conversation_id=conversation_id,
+                seq=first_seq + offset,
+                role=message['role'],
+                parts=message['parts'],
+            )
+            for offset, message in enumerate(new_messages)
+        ])
+        await db.commit()
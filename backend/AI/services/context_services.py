@@ -0,0 +1,123 @@
+# In AI/services/context_services.py
+import os
+from dataclasses import dataclass
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import SessionLocal
+from AI.models import ai_models
+from AI.services import ai_services, chat_history_services
+from AI.services.llm_providers import estimate_tokens
+
+# The system prompt and the model's acknowledgement at the start of every conversation
+PINNED_MESSAGES = 2
+
+# How many recent turns (user message + reply) are always sent verbatim
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "10"))
+# The summary is only recomputed once this many turns have fallen out of the window
+CHAT_SUMMARY_STEP_TURNS = int(os.getenv("CHAT_SUMMARY_STEP_TURNS", "5"))
+
+
+@dataclass
+class ChatContext:
+    messages: list
+    # Estimated prompt tokens avoided by sending the summary instead of the messages it covers
+    tokens_saved: int = 0
+
+
+def _summary_messages(summary: str) -> list:
+    return [
+        {'role': 'user', 'parts': [{'text': f"Summary of our conversation so far:\n{summary}"}]},
+        {'role': 'model', 'parts': [{'text': "Thanks, I have the context of our earlier conversation."}]},
+    ]
+
+
+async def build_context(db: AsyncSession, conversation) -> ChatContext:
+    """
+    Returns the messages to send to the AI for a stored conversation: the pinned
+    system prompt, the running summary (if any) and every message after it.
+    Only those rows are read; the messages folded into the summary are not.
+    """
+    await chat_history_services.migrate_legacy_history(db, conversation)
+
+    first_unsummarized = PINNED_MESSAGES + conversation.summarized_count
+    rows = (await db.scalars(
+        select(ai_models.ChatMessage)
+        .where(
+            ai_models.ChatMessage.conversation_id == conversation.history_id,
+            or_(
+                ai_models.ChatMessage.seq < PINNED_MESSAGES,
+                ai_models.ChatMessage.seq >= first_unsummarized
+            )
+        )
+        .order_by(ai_models.ChatMessage.seq)
+    )).all()
+    messages = [{'role': row.role, 'parts': row.parts} for row in rows]
+
+    if not conversation.summary:
+        return ChatContext(messages=messages)
+
+    summary = _summary_messages(conversation.summary)
+    return ChatContext(
+        messages=messages[:PINNED_MESSAGES] + summary + messages[PINNED_MESSAGES:],
+        tokens_saved=max(conversation.summarized_tokens - estimate_tokens(summary), 0)
+    )
+
+
+async def _load_messages_to_fold(model, conversation_id):
+    """Returns (conversation, messages) when the window has slid far enough, else None."""
+    async with SessionLocal() as db:
+        conversation = await db.scalar(select(model).where(model.history_id == conversation_id))
+        if not conversation:
+            return None
+
+        first_unsummarized = PINNED_MESSAGES + conversation.summarized_count
+        window_start = conversation.message_count - 2 * CHAT_CONTEXT_TURNS
+        if window_start - first_unsummarized < 2 * CHAT_SUMMARY_STEP_TURNS:
+            return None
+
+        rows = (await db.scalars(
+            select(ai_models.ChatMessage)
+            .where(
+                ai_models.ChatMessage.conversation_id == conversation_id,
+                ai_models.ChatMessage.seq >= first_unsummarized,
+                ai_models.ChatMessage.seq < window_start
+            )
+            .order_by(ai_models.ChatMessage.seq)
+        )).all()
+        db.expunge(conversation)
+        return conversation, [{'role': row.role, 'parts': row.parts} for row in rows]
+
+
+async def _store_summary(model, conversation, folded: list, summary: str):
+    async with SessionLocal() as db:
+        # Only the first of two concurrent refreshes wins
+        await db.execute(
+            update(model)
+            .where(
+                model.history_id == conversation.history_id,
+                model.summarized_count == conversation.summarized_count
+            )
+            .values(
+                summary=summary,
+                summarized_count=conversation.summarized_count + len(folded),
+                summarized_tokens=conversation.summarized_tokens + estimate_tokens(folded)
+            )
+        )
+        await db.commit()
+
+
+async def refresh_summary(model, conversation_id):
+    """
+    Folds the messages that slid out of the context window into the running
+    summary. The previous summary is extended rather than recomputed, and nothing
+    happens until CHAT_SUMMARY_STEP_TURNS turns have left the window.
+    Meant to run after the response has been sent.
+    """
+    loaded = await _load_messages_to_fold(model, conversation_id)
+    if loaded is None:
+        return
+
+    conversation, folded = loaded
+    summary = await ai_services.summarize_conversation(conversation.summary, folded)
+    await _store_summary(model, conversation, folded, summary)
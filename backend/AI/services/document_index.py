@@ -0,0 +1,97 @@
+# In AI/services/document_index.py
+# A small lexical (BM25) index over the chunks of one document, so a question
+# about a file only needs the most relevant passages in the prompt.
+# The index stores chunk offsets into the extracted text, not the text itself.
+
+import os
+import re
+import math
+from collections import Counter
+
+DOCUMENT_CHUNK_CHARS = int(os.getenv("DOCUMENT_CHUNK_CHARS", "1200"))
+DOCUMENT_CHUNK_OVERLAP = int(os.getenv("DOCUMENT_CHUNK_OVERLAP", "200"))
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what",
+    "when", "which", "who", "will", "with", "my", "me", "i", "do", "does", "how", "can",
+}
+
+
+def tokenize(text: str) -> list:
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+def chunk_spans(text: str) -> list:
+    """
+    Splits text into [start, end] spans of about DOCUMENT_CHUNK_CHARS characters,
+    overlapping by DOCUMENT_CHUNK_OVERLAP and ending on a paragraph, line or
+    sentence break where one is close.
+    """
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + DOCUMENT_CHUNK_CHARS, len(text))
+        if end < len(text):
+            window = text[start + DOCUMENT_CHUNK_CHARS // 2:end]
+            for separator in ("\n\n", "\n", ". "):
+                position = window.rfind(separator)
+                if position != -1:
+                    end = start + DOCUMENT_CHUNK_CHARS // 2 + position + len(separator)
+                    break
+        spans.append([start, end])
+        if end >= len(text):
+            break
+        start = max(end - DOCUMENT_CHUNK_OVERLAP, start + 1)
+    return spans
+
+
+def build_index(text: str) -> dict:
+    """Builds the JSON-serializable index stored alongside a file."""
+    spans = chunk_spans(text or "")
+    term_frequencies = [dict(Counter(tokenize(text[start:end]))) for start, end in spans]
+    lengths = [sum(frequencies.values()) for frequencies in term_frequencies]
+    document_frequencies = Counter(term for frequencies in term_frequencies for term in frequencies)
+    return {
+        "spans": spans,
+        "tf": term_frequencies,
+        "lengths": lengths,
+        "df": dict(document_frequencies),
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+    }
+
+
+def top_passages(index: dict, text: str, query: str, k: int) -> list:
+    """
+    Returns the text of the `k` chunks that best match the query by BM25, in
+    document order. Short documents are returned whole.
+    """
+    spans = index["spans"]
+    if len(spans) <= k:
+        return [text[start:end] for start, end in spans]
+
+    chunk_count = len(spans)
+    avgdl = index["avgdl"] or 1.0
+    query_terms = set(tokenize(query))
+
+    scores = []
+    for chunk_number, frequencies in enumerate(index["tf"]):
+        score = 0.0
+        length_norm = K1 * (1 - B + B * index["lengths"][chunk_number] / avgdl)
+        for term in query_terms:
+            frequency = frequencies.get(term, 0)
+            if not frequency:
+                continue
+            document_frequency = index["df"][term]
+            idf = math.log(1 + (chunk_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            score += idf * frequency * (K1 + 1) / (frequency + length_norm)
+        scores.append(score)
+
+    # Ties (including no match at all) go to the earlier chunk
+    best = sorted(range(chunk_count), key=lambda chunk_number: (-scores[chunk_number], chunk_number))[:k]
+    return [text[spans[chunk_number][0]:spans[chunk_number][1]] for chunk_number in sorted(best)]
@@ -0,0 +1,182 @@
+# In AI/services/document_store.py
+# Content-addressed store of extracted document text. Each distinct file
+# content has one compressed document_texts row, shared by the files rows of
+# every user who uploaded it; the text is only decompressed when read.
+
+import os
+import re
+import zlib
+from sqlalchemy import func, select
+from sqlalchemy.orm import defer
+from sqlalchemy.dialects.postgresql import insert
+
+from app.api.v1.models import file_models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DOCUMENT_ZSTD_LEVEL = int(os.getenv("DOCUMENT_ZSTD_LEVEL", "10"))
+DOCUMENT_ZLIB_LEVEL = int(os.getenv("DOCUMENT_ZLIB_LEVEL", "6"))
+
+# Text search configuration of the search vectors and queries
+SEARCH_CONFIG = "english"
+# Only this much of a document is indexed for search (tsvector values are limited to 1 MB)
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", "200000"))
+SNIPPET_CHARS = 160
+
+
+def legacy_hash(user_id, file_hash: str) -> str:
+    """
+    Key of a text processed before the server hashed file content (migration
+    006). Its hash came from the client unchecked, so it is kept per user.
+    """
+    return f"legacy:{user_id}:{file_hash}"
+
+
+def compress(text: str):
+    """Returns (codec, compressed bytes), with zstd when it is installed."""
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=DOCUMENT_ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, DOCUMENT_ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is needed to read this document.")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    # 'plain': rows moved over by the migration and not recompressed yet
+    return bytes(data).decode("utf-8")
+
+
+def load_text(document) -> str:
+    """The decompressed text of a DocumentText row ('' without one)."""
+    if document is None:
+        return ""
+    return decompress(document.codec, document.compressed_text)
+
+
+async def document_exists(db, content_hash: str) -> bool:
+    return await db.scalar(select(file_models.DocumentText.content_hash).where(
+        file_models.DocumentText.content_hash == content_hash
+    )) is not None
+
+
+async def store(db, content_hash: str, text: str, text_index: dict):
+    """Adds the text for a content hash unless it is stored already (not committed)."""
+    codec, compressed_text = compress(text)
+    await db.execute(
+        insert(file_models.DocumentText)
+        .values(
+            content_hash=content_hash,
+            codec=codec,
+            compressed_text=compressed_text,
+            text_length=len(text),
+            text_index=text_index,
+            search_vector=search_vector(text)
+        )
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+
+
+def search_vector(text: str):
+    return func.to_tsvector(SEARCH_CONFIG, text[:SEARCH_MAX_CHARS])
+
+
+async def search(db, user_id: str, query: str, limit: int) -> list:
+    """
+    Returns (file, document, rank) for the user's files whose text matches the
+    query (web search syntax: words, "phrases", -exclusions), best match first.
+    Ranking uses the GIN-indexed search vectors; no text is decompressed.
+    """
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank(file_models.DocumentText.search_vector, ts_query)
+    result = await db.execute(
+        select(file_models.File, file_models.DocumentText, rank.label("rank"))
+        .join(file_models.DocumentText, file_models.File.file_hash == file_models.DocumentText.content_hash)
+        .options(
+            # Only the compressed text is needed, for the snippets
+            defer(file_models.DocumentText.search_vector),
+            defer(file_models.DocumentText.text_index)
+        )
+        .where(
+            file_models.File.user_id == user_id,
+            file_models.DocumentText.search_vector.op("@@")(ts_query)
+        )
+        .order_by(rank.desc(), file_models.File.uploaded_at.desc())
+        .limit(limit)
+    )
+    return result.all()
+
+
+def snippet(text: str, query: str) -> str:
+    """
+    The passage of the text around the first occurrence of a query word.
+    Words are matched by their first letters, roughly like the stemmed search.
+    """
+    words = [word for word in re.findall(r"\w+", query.lower()) if len(word) > 1]
+    first_match = None
+    for word in words:
+        stem = word[:max(4, len(word) - 2)]
+        match = re.search(rf"\b{re.escape(stem)}", text, re.IGNORECASE)
+        if match and (first_match is None or match.start() < first_match):
+            first_match = match.start()
+
+    start = max((first_match or 0) - SNIPPET_CHARS // 3, 0)
+    end = min(start + SNIPPET_CHARS, len(text))
+    passage = " ".join(text[start:end].split())
+    return ("..." if start > 0 else "") + passage + ("..." if end < len(text) else "")
+
+
+async def backfill_search_vectors(db, batch_size: int = 100) -> int:
+    """Adds search vectors to documents stored before search existed. Returns how many were updated."""
+    documents = (await db.scalars(
+        select(file_models.DocumentText)
+        .where(file_models.DocumentText.search_vector.is_(None))
+        .limit(batch_size)
+    )).all()
+    for document in documents:
+        document.search_vector = search_vector(load_text(document))
+    await db.commit()
+    return len(documents)
+
+
+async def recompress_plain_documents(db, batch_size: int = 100) -> int:
+    """
+    Compresses documents the migration copied over uncompressed, a batch at a
+    time. Returns how many were compressed; run until it returns 0.
+    """
+    documents = (await db.scalars(
+        select(file_models.DocumentText)
+        .where(file_models.DocumentText.codec == "plain")
+        .limit(batch_size)
+    )).all()
+    for document in documents:
+        document.codec, document.compressed_text = compress(load_text(document))
+    await db.commit()
+    return len(documents)
+
+
+async def _backfill():
+    from app.core.database import SessionLocal
+
+    async with SessionLocal() as db:
+        for backfill, done in ((recompress_plain_documents, "Compressed"), (backfill_search_vectors, "Indexed")):
+            total = 0
+            while True:
+                updated = await backfill(db)
+                if not updated:
+                    break
+                total += updated
+            print(f"{done} {total} documents.")
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(_backfill())
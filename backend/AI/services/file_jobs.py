@@ -0,0 +1,192 @@
+# In AI/services/file_jobs.py
+# Background job queue for file processing. Jobs are rows in file_jobs; their
+# ids go through an in-process queue to a bounded pool of worker tasks, so a
+# burst of uploads never holds more than FILE_JOB_WORKERS downloads (and DB
+# connections) at once. Unfinished jobs are picked up again on startup.
+
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import selectinload
+
+from app.core import metrics
+from app.core.database import SessionLocal
+from app.api.v1.models import file_models
+from app.api.v1.schemas import file_schemas
+from AI.services import document_store, file_processing
+
+FILE_JOB_WORKERS = int(os.getenv("FILE_JOB_WORKERS", "2"))
+# A job still 'running' after this long belongs to a worker that died
+FILE_JOB_STALE_SECONDS = int(os.getenv("FILE_JOB_STALE_SECONDS", "600"))
+# Runs of a job interrupted by restarts before it is marked failed
+FILE_JOB_MAX_ATTEMPTS = int(os.getenv("FILE_JOB_MAX_ATTEMPTS", "3"))
+
+_counters = metrics.Counters("enqueued", "resumed", "succeeded", "failed")
+_queue = None
+_workers = []
+
+
+async def find_processed(db, file_data: file_schemas.FileProcessRequest, user_id: str):
+    """
+    The finished result for a file this user processed before, which needs no
+    job (its job_id is None), or None.
+    """
+    existing_file = await file_processing.find_processed_file(db, file_data.file_hash, user_id)
+    if existing_file is None:
+        return None
+    return file_schemas.FileJobResponse(status="succeeded", result=_file_result(existing_file))
+
+
+async def create_job(db, file_data: file_schemas.FileProcessRequest, user_id: str) -> file_models.FileJob:
+    """Records a queued job for the file."""
+    job = file_models.FileJob(user_id=user_id, request=file_data.dict())
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+def enqueue(job_id):
+    _counters.increment("enqueued")
+    _queue.put_nowait(job_id)
+
+
+def _file_result(file_record: file_models.File) -> file_schemas.FileProcessResponse:
+    return file_schemas.FileProcessResponse(
+        file_id=file_record.file_id,
+        extracted_text=document_store.load_text(file_record.document)
+    )
+
+
+async def job_response(db, job: file_models.FileJob) -> file_schemas.FileJobResponse:
+    result = None
+    if job.status == "succeeded":
+        file_record = await db.scalar(
+            select(file_models.File)
+            .options(selectinload(file_models.File.document))
+            .where(file_models.File.file_id == job.file_id)
+        )
+        if file_record:
+            result = _file_result(file_record)
+    return file_schemas.FileJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        stage=job.stage,
+        error=job.error,
+        result=result
+    )
+
+
+async def _update_job(job_id, **values):
+    async with SessionLocal() as db:
+        await db.execute(
+            update(file_models.FileJob)
+            .where(file_models.FileJob.job_id == job_id)
+            .values(updated_at=datetime.now(timezone.utc), **values)
+        )
+        await db.commit()
+
+
+async def _claim_job(job_id):
+    """Marks a queued job as running; returns its request, or None if another worker has it."""
+    async with SessionLocal() as db:
+        claimed = (await db.execute(
+            update(file_models.FileJob)
+            .where(file_models.FileJob.job_id == job_id, file_models.FileJob.status == "queued")
+            .values(
+                status="running",
+                attempts=file_models.FileJob.attempts + 1,
+                updated_at=datetime.now(timezone.utc)
+            )
+            .returning(file_models.FileJob.user_id, file_models.FileJob.request, file_models.FileJob.attempts)
+        )).first()
+        await db.commit()
+        return claimed
+
+
+async def _run_job(job_id):
+    claimed = await _claim_job(job_id)
+    if claimed is None:
+        return
+    user_id, request, attempts = claimed
+    if attempts > FILE_JOB_MAX_ATTEMPTS:
+        _counters.increment("failed")
+        await _update_job(job_id, status="failed", stage=None, error="File processing was interrupted too many times.")
+        return
+
+    async def on_stage(stage: str):
+        await _update_job(job_id, stage=stage)
+
+    try:
+        result = await file_processing.process_file(
+            file_schemas.FileProcessRequest(**request),
+            str(user_id),
+            on_stage=on_stage
+        )
+    except Exception as e:
+        _counters.increment("failed")
+        await _update_job(job_id, status="failed", stage=None, error=str(e))
+    else:
+        _counters.increment("succeeded")
+        await _update_job(job_id, status="succeeded", stage=None, file_id=result.file_id)
+
+
+async def _unfinished_job_ids() -> list:
+    """Queued jobs and jobs left 'running' by a worker that stopped, which are queued again."""
+    async with SessionLocal() as db:
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=FILE_JOB_STALE_SECONDS)
+        rows = (await db.execute(
+            update(file_models.FileJob)
+            .where(or_(
+                file_models.FileJob.status == "queued",
+                (file_models.FileJob.status == "running") & (file_models.FileJob.updated_at < stale_before)
+            ))
+            .values(status="queued")
+            .returning(file_models.FileJob.job_id)
+        )).all()
+        await db.commit()
+        return [row.job_id for row in rows]
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _run_job(job_id)
+        except Exception as e:
+            print(f"File job {job_id} crashed: {e}")
+        finally:
+            _queue.task_done()
+
+
+async def start():
+    """Starts the worker pool and resumes unfinished jobs. Called on application startup."""
+    global _queue
+    _queue = asyncio.Queue()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(FILE_JOB_WORKERS))
+    try:
+        job_ids = await _unfinished_job_ids()
+    except Exception as e:
+        print(f"Could not resume file jobs: {e}")
+        return
+    for job_id in job_ids:
+        _counters.increment("resumed")
+        _queue.put_nowait(job_id)
+
+
+async def stop():
+    """Stops the workers; jobs they were running are resumed after the next start."""
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+def stats() -> dict:
+    values = _counters.as_dict()
+    values["queued"] = _queue.qsize() if _queue is not None else 0
+    return values
+
+
+metrics.register("file_jobs", stats)
@@ -0,0 +1,134 @@
+# In AI/services/file_processing.py
+# Download, text extraction and indexing of an uploaded file. Runs in the
+# background job workers (see file_jobs.py), never in a request thread.
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from starlette.concurrency import run_in_threadpool
+
+from app.core.database import SessionLocal
+from app.core.singleflight import SingleFlight
+from app.api.v1.models import file_models
+from app.api.v1.schemas import file_schemas
+from AI.services import ai_services, document_index, document_store
+
+_file_flight = SingleFlight("file_processing")
+
+
+async def find_processed_file(db, file_hash: str, user_id: str):
+    """
+    Finds the user's file record with this content hash (or, for a file
+    processed before hashes were checked, the hash the client sent then), with
+    its document.
+    """
+    return await db.scalar(
+        select(file_models.File)
+        .options(selectinload(file_models.File.document))
+        .where(
+            file_models.File.file_hash.in_([file_hash, document_store.legacy_hash(user_id, file_hash)]),
+            file_models.File.user_id == user_id
+        )
+    )
+
+
+def _file_response(file_record, extracted_text: str = None) -> file_schemas.FileProcessResponse:
+    if extracted_text is None:
+        extracted_text = document_store.load_text(file_record.document)
+    return file_schemas.FileProcessResponse(
+        file_id=file_record.file_id,
+        extracted_text=extracted_text
+    )
+
+
+async def _find_file_response(file_hash: str, user_id: str):
+    async with SessionLocal() as db:
+        existing_file = await find_processed_file(db, file_hash, user_id)
+        return _file_response(existing_file) if existing_file else None
+
+
+async def _document_exists(content_hash: str) -> bool:
+    async with SessionLocal() as db:
+        return await document_store.document_exists(db, content_hash)
+
+
+async def _save_file(new_file: file_models.File, extracted_text: str = None, text_index: dict = None) -> file_schemas.FileProcessResponse:
+    """Saves the user's file record, and the document text when it was extracted here."""
+    async with SessionLocal() as db:
+        if extracted_text is not None:
+            await document_store.store(db, new_file.file_hash, extracted_text, text_index)
+        db.add(new_file)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent job of this user saved the same file first; use its record
+            await db.rollback()
+            existing_file = await find_processed_file(db, new_file.file_hash, new_file.user_id)
+            if existing_file is None:
+                # Not a duplicate (e.g. the user's profile is gone); fail the job with it
+                raise
+            return _file_response(existing_file)
+        if extracted_text is None:
+            await db.refresh(new_file, ["document"])
+        return _file_response(new_file, extracted_text)
+
+
+async def _process_new_file(file_data: file_schemas.FileProcessRequest, user_id: str, on_stage) -> file_schemas.FileProcessResponse:
+    # 1. The client's hash is only trusted to find a file this user processed before
+    existing_file = await _find_file_response(file_data.file_hash, user_id)
+    if existing_file:
+        print(f"File with hash {file_data.file_hash} already exists. Returning cached text.")
+        return existing_file
+
+    # 2. Download it from Supabase Storage, hashing what is actually received
+    await on_stage("downloading")
+    try:
+        downloaded = await ai_services.download_file(file_data.file_url)
+    except ai_services.FileTooLargeError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to download file: {e}")
+
+    new_file = file_models.File(
+        user_id=user_id,
+        file_url=file_data.file_url,
+        file_hash=downloaded.sha256,
+        file_type=file_data.file_type,
+        description=file_data.description
+    )
+    with downloaded:
+        if downloaded.sha256 != file_data.file_hash:
+            print(f"Hash of {file_data.file_url} is {downloaded.sha256}, not the {file_data.file_hash} the client sent.")
+            existing_file = await _find_file_response(downloaded.sha256, user_id)
+            if existing_file:
+                return existing_file
+
+        # 3. Someone uploaded the same content before: share its text
+        if await _document_exists(downloaded.sha256):
+            await on_stage("saving")
+            return await _save_file(new_file)
+
+        # 4. Extract the text from the file content and index it
+        await on_stage("extracting")
+        extracted_text = await ai_services.extract_text_from_file(downloaded, file_data.file_type)
+    text_index = await run_in_threadpool(document_index.build_index, extracted_text)
+
+    # 5. Save the compressed text and the user's file record
+    await on_stage("saving")
+    return await _save_file(new_file, extracted_text, text_index)
+
+
+async def _ignore_stage(stage: str):
+    pass
+
+
+async def process_file(file_data: file_schemas.FileProcessRequest, user_id: str, on_stage=_ignore_stage) -> file_schemas.FileProcessResponse:
+    """
+    Downloads a file, extracts its text and saves the user's record. Content
+    the user uploaded before returns that record; content another user uploaded
+    reuses its stored text. The content hash is computed here; the client's
+    `file_hash` only finds files of the same user before downloading.
+    Concurrent calls of one user for the same hash share one download and
+    extraction. `on_stage` is awaited as the work progresses.
+    """
+    return await _file_flight.do_async((user_id, file_data.file_hash), _process_new_file, file_data, user_id, on_stage)
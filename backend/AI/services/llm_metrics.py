@@ -0,0 +1,190 @@
+# In AI/services/llm_metrics.py
+# Records every LLM provider call: endpoint, model, token counts, time to first
+# token, total latency and estimated cost. Aggregates are reported under
+# 'llm_usage' in the metrics endpoint; the totals of one API request are added
+# to its response as X-LLM-* headers by the middleware in main.py.
+
+import os
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+from app.core import metrics
+from AI.services.llm_providers import LLMProvider, PromptPrefix
+
+# USD per million tokens as (prompt, output)
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "fake-llm": (0.0, 0.0),
+}
+# Override the price of every model, e.g. for a negotiated rate
+LLM_PRICE_PROMPT_PER_MTOK = os.getenv("LLM_PRICE_PROMPT_PER_MTOK")
+LLM_PRICE_OUTPUT_PER_MTOK = os.getenv("LLM_PRICE_OUTPUT_PER_MTOK")
+# Latency samples kept per endpoint and model for the percentiles
+LLM_METRICS_LATENCY_SAMPLES = int(os.getenv("LLM_METRICS_LATENCY_SAMPLES", "500"))
+
+
+def estimate_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    prompt_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    if LLM_PRICE_PROMPT_PER_MTOK is not None:
+        prompt_price = float(LLM_PRICE_PROMPT_PER_MTOK)
+    if LLM_PRICE_OUTPUT_PER_MTOK is not None:
+        output_price = float(LLM_PRICE_OUTPUT_PER_MTOK)
+    return (prompt_tokens * prompt_price + output_tokens * output_price) / 1_000_000
+
+
+class RequestUsage:
+    """LLM totals of one API request, filled in by every call made while handling it."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+    @property
+    def endpoint(self) -> str:
+        # Routing stores the endpoint function in the scope before it runs
+        endpoint = self.scope.get("endpoint")
+        if endpoint is not None:
+            return endpoint.__name__
+        return self.scope.get("path", "unknown")
+
+    def headers(self) -> dict:
+        return {
+            "X-LLM-Calls": str(self.calls),
+            "X-LLM-Time-Ms": str(round(self.seconds * 1000)),
+            "X-LLM-Prompt-Tokens": str(self.prompt_tokens),
+            "X-LLM-Output-Tokens": str(self.output_tokens),
+            "X-LLM-Cost-USD": f"{self.cost:.6f}",
+        }
+
+
+_request_usage: ContextVar = ContextVar("llm_request_usage", default=None)
+
+
+def start_request(scope: dict) -> RequestUsage:
+    """Starts collecting the LLM usage of the current request (called by the middleware)."""
+    usage = RequestUsage(scope)
+    _request_usage.set(usage)
+    return usage
+
+
+def _percentile(ordered: list, fraction: float):
+    if not ordered:
+        return None
+    return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000)
+
+
+class _Aggregate:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=LLM_METRICS_LATENCY_SAMPLES)
+        self.first_token_latencies = deque(maxlen=LLM_METRICS_LATENCY_SAMPLES)
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        first_token = sorted(self.first_token_latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+            "avg_latency_ms": round(self.seconds * 1000 / self.calls) if self.calls else None,
+            "p50_latency_ms": _percentile(latencies, 0.5),
+            "p95_latency_ms": _percentile(latencies, 0.95),
+            "p50_first_token_ms": _percentile(first_token, 0.5),
+            "p95_first_token_ms": _percentile(first_token, 0.95),
+        }
+
+
+_lock = threading.Lock()
+_aggregates = {}  # "endpoint model" -> _Aggregate
+
+
+def record_call(model: str, started: float, first_token_at, prompt_tokens: int, output_tokens: int, failed: bool):
+    """Adds one provider call to the aggregates and to the current request's totals."""
+    finished = time.monotonic()
+    cost = estimate_cost(model, prompt_tokens, output_tokens)
+    usage = _request_usage.get()
+    endpoint = usage.endpoint if usage is not None else "background"
+
+    with _lock:
+        aggregate = _aggregates.get(f"{endpoint} {model}")
+        if aggregate is None:
+            aggregate = _aggregates[f"{endpoint} {model}"] = _Aggregate()
+        aggregate.calls += 1
+        aggregate.prompt_tokens += prompt_tokens
+        aggregate.output_tokens += output_tokens
+        aggregate.cost += cost
+        aggregate.seconds += finished - started
+        if failed:
+            aggregate.errors += 1
+        else:
+            aggregate.latencies.append(finished - started)
+            if first_token_at is not None:
+                aggregate.first_token_latencies.append(first_token_at - started)
+
+    if usage is not None:
+        usage.calls += 1
+        usage.seconds += finished - started
+        usage.prompt_tokens += prompt_tokens
+        usage.output_tokens += output_tokens
+        usage.cost += cost
+
+
+def stats() -> dict:
+    with _lock:
+        return {key: aggregate.as_dict() for key, aggregate in sorted(_aggregates.items())}
+
+
+class InstrumentedProvider(LLMProvider):
+    """Wraps a provider and records each of its calls. Cancelled calls (e.g. lost hedges) count as errors."""
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.name = provider.name
+        self.model_name = provider.model_name
+
+    async def generate(self, contents, json_mode: bool = False, prefix: PromptPrefix = None):
+        started = time.monotonic()
+        try:
+            response = await self.provider.generate(contents, json_mode=json_mode, prefix=prefix)
+        except BaseException:
+            record_call(self.model_name, started, None, 0, 0, failed=True)
+            raise
+        # Without streaming the whole reply arrives at once
+        record_call(
+            response.model, started, time.monotonic(),
+            response.prompt_tokens, response.output_tokens, failed=False
+        )
+        return response
+
+    async def generate_stream(self, contents, prefix: PromptPrefix = None, usage: dict = None):
+        usage = usage if usage is not None else {}
+        started = time.monotonic()
+        first_token_at = None
+        failed = True
+        try:
+            async for chunk in self.provider.generate_stream(contents, prefix=prefix, usage=usage):
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                yield chunk
+            failed = False
+        finally:
+            record_call(
+                self.model_name, started, first_token_at,
+                usage.get("prompt_tokens", 0), usage.get("output_tokens", 0), failed=failed
+            )
+
+
+metrics.register("llm_usage", stats)
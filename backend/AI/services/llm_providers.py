@@ -0,0 +1,386 @@
+# In AI/services/llm_providers.py
+import os
+import re
+import json
+import math
+import random
+import time
+import asyncio
+import hashlib
+from datetime import timedelta
+from dataclasses import dataclass
+from dotenv import load_dotenv
+
+from app.core.singleflight import SingleFlight
+
+load_dotenv()
+
+# Which provider the AI services use: 'gemini' (default) or 'fake' for offline load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+# Shared prompt prefixes at least this long (estimated tokens) are sent through
+# Gemini context caching; shorter ones are below the API minimum and sent inline
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+# Configuration for the OCR analysis (JSON output)
+json_generation_config = {
+  "temperature": 0.2,
+  "top_p": 1,
+  "top_k": 1,
+  "max_output_tokens": 2048,
+  "response_mime_type": "application/json",
+}
+
+# Configuration for the chat (text output)
+chat_generation_config = {
+  "temperature": 0.9,
+  "top_p": 1,
+  "top_k": 1,
+  "max_output_tokens": 2048,
+}
+
+
+class LLMProviderError(Exception):
+    """
+    Raised by a provider when a call fails. `transient` marks failures worth
+    retrying: timeouts, rate limits and server errors.
+    """
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class PromptPrefix:
+    """
+    Messages shared by the start of many prompts, e.g. a medicine's monograph.
+    `key` identifies the messages and must change whenever they do.
+    """
+    key: str
+    messages: list
+
+
+def user_message(text: str) -> dict:
+    return {'role': 'user', 'parts': [{'text': text}]}
+
+
+def model_message(text: str) -> dict:
+    return {'role': 'model', 'parts': [{'text': text}]}
+
+
+def with_prefix(contents, prefix: PromptPrefix = None):
+    """Returns `contents` as a message list with the prefix messages in front."""
+    if prefix is None:
+        return contents
+    if isinstance(contents, str):
+        contents = [user_message(contents)]
+    return prefix.messages + contents
+
+
+def estimate_tokens(contents) -> int:
+    """Rough token count (about 4 characters per token)."""
+    if isinstance(contents, str):
+        return len(contents) // 4
+    return sum(len(part['text']) for message in contents for part in message['parts']) // 4
+
+
+class ChatSession:
+    """
+    A conversation whose history is kept on our side as a list of
+    {'role', 'parts'} dicts. Every message is one stateless call with the full
+    history, so a failed call leaves the history untouched. The optional prefix
+    is sent in front of the history but is not part of it.
+    """
+
+    def __init__(self, provider, history: list, prefix: PromptPrefix = None):
+        self.provider = provider
+        self.history = list(history)
+        self.prefix = prefix
+
+    async def send_message(self, prompt: str) -> LLMResponse:
+        message = user_message(prompt)
+        response = await self.provider.generate(self.history + [message], prefix=self.prefix)
+        self.history += [message, model_message(response.text)]
+        return response
+
+    async def send_message_stream(self, prompt: str):
+        """Yields the reply text chunk by chunk; the history is updated once the reply is complete."""
+        message = user_message(prompt)
+        chunks = []
+        async for chunk in self.provider.generate_stream(self.history + [message], prefix=self.prefix):
+            chunks.append(chunk)
+            yield chunk
+        self.history += [message, model_message("".join(chunks))]
+
+
+class LLMProvider:
+    """
+    Interface every provider implements. `contents` is either a prompt string or a
+    list of {'role', 'parts'} messages; `prefix` is a PromptPrefix to send in
+    front of them, which providers may cache on their side.
+    """
+    name = "base"
+
+    def start_chat(self, history: list, prefix: PromptPrefix = None) -> ChatSession:
+        return ChatSession(self, history, prefix)
+
+    async def generate(self, contents, json_mode: bool = False, prefix: PromptPrefix = None) -> LLMResponse:
+        raise NotImplementedError
+
+    async def generate_stream(self, contents, prefix: PromptPrefix = None, usage: dict = None):
+        """
+        Async generator of reply text chunks. When `usage` is given, its
+        'prompt_tokens' and 'output_tokens' are filled in once the stream ends.
+        """
+        raise NotImplementedError
+        yield
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    model_name = "gemini-2.5-flash"
+
+    def __init__(self):
+        # Imported here so the fake provider works without the Google SDK installed
+        import google.generativeai as genai
+        from google.generativeai import caching
+        from google.api_core import exceptions as google_exceptions
+
+        # Ensure your GOOGLE_API_KEY is in the .env file
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.genai = genai
+        self.caching = caching
+        self.transient_errors = (
+            google_exceptions.TooManyRequests,
+            google_exceptions.InternalServerError,
+            google_exceptions.BadGateway,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            asyncio.TimeoutError,
+            ConnectionError,
+        )
+
+        # Initialize the model for OCR/JSON tasks
+        self.json_model = genai.GenerativeModel(
+            model_name=self.model_name,
+            generation_config=json_generation_config
+        )
+        # Initialize the model for chat tasks
+        self.chat_model = genai.GenerativeModel(
+            model_name=self.model_name,
+            generation_config=chat_generation_config
+        )
+
+        # PromptPrefix key -> (model bound to the cached prefix, monotonic expiry)
+        self._cached_models = {}
+        self._cache_flight = SingleFlight("gemini_context_cache")
+
+    async def _create_cached_model(self, prefix: PromptPrefix):
+        cached_content = await asyncio.to_thread(
+            self.caching.CachedContent.create,
+            model=f"models/{self.model_name}",
+            display_name=prefix.key,
+            contents=prefix.messages,
+            ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+        )
+        model = self.genai.GenerativeModel.from_cached_content(
+            cached_content=cached_content,
+            generation_config=chat_generation_config
+        )
+        now = time.monotonic()
+        self._cached_models = {
+            key: entry for key, entry in self._cached_models.items() if entry[1] > now
+        }
+        # Stop using it a little before the server-side cache expires
+        self._cached_models[prefix.key] = (model, now + 0.9 * GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+        return model
+
+    async def _model_with_cached_prefix(self, prefix: PromptPrefix):
+        """
+        Returns a chat model whose context cache holds the prefix, or None when
+        the prefix is too short to cache or caching fails (then it is sent inline).
+        """
+        if prefix is None or estimate_tokens(prefix.messages) < GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        entry = self._cached_models.get(prefix.key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        try:
+            return await self._cache_flight.do_async(prefix.key, self._create_cached_model, prefix)
+        except Exception as e:
+            print(f"Gemini context caching failed for {prefix.key}, sending it inline: {e}")
+            return None
+
+    async def _chat_model_and_contents(self, contents, prefix: PromptPrefix):
+        cached_model = await self._model_with_cached_prefix(prefix)
+        if cached_model is not None:
+            return cached_model, contents
+        return self.chat_model, with_prefix(contents, prefix)
+
+    def _usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return 0, 0
+        return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+
+    async def generate(self, contents, json_mode: bool = False, prefix: PromptPrefix = None) -> LLMResponse:
+        if json_mode:
+            model, contents = self.json_model, with_prefix(contents, prefix)
+        else:
+            model, contents = await self._chat_model_and_contents(contents, prefix)
+        try:
+            response = await model.generate_content_async(contents)
+            text = response.text
+        except Exception as e:
+            raise LLMProviderError(f"Google AI call failed: {e}", transient=isinstance(e, self.transient_errors)) from e
+        prompt_tokens, output_tokens = self._usage(response)
+        return LLMResponse(text=text, model=self.model_name, prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+
+    async def generate_stream(self, contents, prefix: PromptPrefix = None, usage: dict = None):
+        model, contents = await self._chat_model_and_contents(contents, prefix)
+        try:
+            response = await model.generate_content_async(contents, stream=True)
+            async for chunk in response:
+                # The usage metadata of the last chunk covers the whole reply
+                if usage is not None and getattr(chunk, "usage_metadata", None) is not None:
+                    usage["prompt_tokens"], usage["output_tokens"] = self._usage(chunk)
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks that carry no text parts (e.g. only a finish reason)
+                    continue
+                if text:
+                    yield text
+        except Exception as e:
+            raise LLMProviderError(f"Google AI call failed: {e}", transient=isinstance(e, self.transient_errors)) from e
+
+
+class FakeProvider(LLMProvider):
+    """
+    A deterministic local stand-in for load tests and benchmarks. Replies depend
+    only on the prompt; latency and failures follow the LLM_FAKE_* settings:
+
+    - LLM_FAKE_LATENCY_MS: median time to first token (default 800)
+    - LLM_FAKE_LATENCY_DISTRIBUTION: 'fixed', 'uniform' (0.5x-1.5x) or 'lognormal' (default)
+    - LLM_FAKE_LATENCY_SIGMA: spread of the lognormal distribution (default 0.5)
+    - LLM_FAKE_TOKENS_PER_SECOND: output rate after the first token (default 60)
+    - LLM_FAKE_OUTPUT_TOKENS: length of chat replies (default 150)
+    - LLM_FAKE_FAILURE_RATE: probability that a call raises (default 0)
+    - LLM_FAKE_SEED: seed for the latency and failure draws (default 0)
+    """
+    name = "fake"
+    model_name = "fake-llm"
+
+    def __init__(self):
+        self.latency_ms = float(os.getenv("LLM_FAKE_LATENCY_MS", "800"))
+        self.distribution = os.getenv("LLM_FAKE_LATENCY_DISTRIBUTION", "lognormal")
+        self.sigma = float(os.getenv("LLM_FAKE_LATENCY_SIGMA", "0.5"))
+        self.tokens_per_second = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "60"))
+        self.output_tokens = int(os.getenv("LLM_FAKE_OUTPUT_TOKENS", "150"))
+        self.failure_rate = float(os.getenv("LLM_FAKE_FAILURE_RATE", "0"))
+        self.random = random.Random(int(os.getenv("LLM_FAKE_SEED", "0")))
+
+    def _first_token_delay(self) -> float:
+        if self.distribution == "fixed":
+            delay_ms = self.latency_ms
+        elif self.distribution == "uniform":
+            delay_ms = self.random.uniform(0.5 * self.latency_ms, 1.5 * self.latency_ms)
+        else:
+            delay_ms = self.latency_ms * math.exp(self.random.gauss(0, self.sigma))
+        return delay_ms / 1000
+
+    def _maybe_fail(self):
+        if self.random.random() < self.failure_rate:
+            raise LLMProviderError("Injected failure from the fake LLM provider", transient=True)
+
+    def _prompt_text(self, contents) -> str:
+        if isinstance(contents, str):
+            return contents
+        return "\n".join(part['text'] for message in contents for part in message['parts'])
+
+    def _reply(self, prompt: str, json_mode: bool) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        if json_mode:
+            # Batch OCR prompts number their texts as "Text 0:", "Text 1:", ...
+            batch_indexes = re.findall(r"^\s*Text (\d+):", prompt, re.MULTILINE)
+            if batch_indexes:
+                return json.dumps([
+                    {
+                        "index": int(index),
+                        "name": f"Fakemed-{digest[:6]}-{index}",
+                        "description": "A placeholder medicine returned by the fake LLM provider."
+                    }
+                    for index in batch_indexes
+                ])
+            return json.dumps({
+                "name": f"Fakemed-{digest[:6]}",
+                "description": "A placeholder medicine returned by the fake LLM provider."
+            })
+        words = [digest[i:i + 4] for i in range(0, len(digest), 4)]
+        return " ".join(words[i % len(words)] for i in range(self.output_tokens))
+
+    def _response(self, contents, text: str) -> LLMResponse:
+        return LLMResponse(
+            text=text,
+            model=self.model_name,
+            prompt_tokens=estimate_tokens(contents),
+            output_tokens=len(text) // 4
+        )
+
+    async def generate(self, contents, json_mode: bool = False, prefix: PromptPrefix = None) -> LLMResponse:
+        contents = with_prefix(contents, prefix)
+        text = self._reply(self._prompt_text(contents), json_mode)
+        output_tokens = len(text) // 4
+        await asyncio.sleep(self._first_token_delay() + output_tokens / self.tokens_per_second)
+        self._maybe_fail()
+        return self._response(contents, text)
+
+    async def generate_stream(self, contents, prefix: PromptPrefix = None, usage: dict = None):
+        contents = with_prefix(contents, prefix)
+        text = self._reply(self._prompt_text(contents), json_mode=False)
+        await asyncio.sleep(self._first_token_delay())
+        self._maybe_fail()
+        # Like the real API, the reply arrives in chunks of several words
+        words = text.split(" ")
+        for start in range(0, len(words), 8):
+            chunk = " ".join(words[start:start + 8])
+            if start:
+                chunk = f" {chunk}"
+            await asyncio.sleep((len(chunk) // 4) / self.tokens_per_second)
+            yield chunk
+        if usage is not None:
+            usage["prompt_tokens"], usage["output_tokens"] = estimate_tokens(contents), len(text) // 4
+
+
+_PROVIDERS = {
+    "gemini": GeminiProvider,
+    "fake": FakeProvider,
+}
+
+_provider = None
+
+
+def get_provider() -> LLMProvider:
+    """
+    Returns the process-wide provider selected by LLM_PROVIDER, wrapped with
+    retries, hedging and the circuit breaker. Every underlying call, including
+    retries and hedges, is recorded by llm_metrics.
+    """
+    global _provider
+    if _provider is None:
+        if LLM_PROVIDER not in _PROVIDERS:
+            raise ValueError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}', expected one of {sorted(_PROVIDERS)}")
+        from AI.services.llm_metrics import InstrumentedProvider
+        from AI.services.resilience import ResilientProvider
+        _provider = ResilientProvider(InstrumentedProvider(_PROVIDERS[LLM_PROVIDER]()))
+    return _provider
@@ -0,0 +1,83 @@
+# In AI/services/medicine_context.py
+# Renders the monograph of a medicine (usage, dosage, side effects, ...) once
+# and reuses it as the shared prompt prefix of every chat about that medicine.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.core import metrics
+from AI.services.llm_providers import PromptPrefix, model_message, user_message
+
+MEDICINE_CONTEXT_CACHE_SIZE = int(os.getenv("MEDICINE_CONTEXT_CACHE_SIZE", "1024"))
+
+# (label, column) pairs of the Medicine columns included in the context
+MEDICINE_FIELDS = [
+    ("Generic name", "generic_name"),
+    ("Manufacturer", "manufacturer"),
+    ("Usage", "usage"),
+    ("Dosage", "dosage"),
+    ("Side effects", "side_effects"),
+    ("Interactions", "interactions"),
+    ("Precautions", "precautions"),
+    ("Storage", "storage"),
+]
+
+_counters = metrics.Counters("hits", "renders")
+_cache = OrderedDict() # medicine_id -> (fingerprint, PromptPrefix or None)
+_lock = threading.Lock()
+
+
+def _fingerprint(medicine) -> str:
+    values = [medicine.name] + [getattr(medicine, column) or "" for _, column in MEDICINE_FIELDS]
+    return hashlib.sha256("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def _render(medicine, fingerprint: str):
+    lines = [
+        f"{label}: {getattr(medicine, column).strip()}"
+        for label, column in MEDICINE_FIELDS
+        if getattr(medicine, column) and getattr(medicine, column).strip()
+    ]
+    if not lines:
+        return None
+
+    monograph = "\n".join(lines)
+    return PromptPrefix(
+        key=f"medicine:{medicine.medicine_id}:{fingerprint[:16]}",
+        messages=[
+            user_message(
+                f"Reference information about the medicine {medicine.name}. "
+                f"Use it when answering questions about this medicine:\n{monograph}"
+            ),
+            model_message(f"Thanks, I will use this information about {medicine.name}."),
+        ]
+    )
+
+
+def get_prompt_prefix(medicine):
+    """
+    Returns the PromptPrefix with the medicine's monograph, or None when the
+    catalog row has nothing beyond the name. The rendered prefix is cached per
+    medicine and re-rendered whenever any of the columns it uses change.
+    """
+    fingerprint = _fingerprint(medicine)
+    with _lock:
+        cached = _cache.get(medicine.medicine_id)
+        if cached is not None and cached[0] == fingerprint:
+            _cache.move_to_end(medicine.medicine_id)
+            _counters.increment("hits")
+            return cached[1]
+
+    prefix = _render(medicine, fingerprint)
+    _counters.increment("renders")
+    with _lock:
+        _cache[medicine.medicine_id] = (fingerprint, prefix)
+        _cache.move_to_end(medicine.medicine_id)
+        while len(_cache) > MEDICINE_CONTEXT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prefix
+
+
+metrics.register("medicine_context", _counters.as_dict)
@@ -0,0 +1,151 @@
+# In AI/services/ocr_cache.py
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core import metrics
+from app.core.database import SessionLocal
+from AI.models import ai_models
+
+OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "2048"))
+# Expired rows are purged from Postgres once every this many stores
+OCR_CACHE_PURGE_EVERY = 500
+
+_counters = metrics.Counters("memory_hits", "db_hits", "misses", "stores", "memory_evictions", "db_errors")
+_memory = OrderedDict() # key -> (expires_at monotonic seconds, result)
+_memory_lock = threading.Lock()
+
+_NOISE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_ocr_text(text: str) -> str:
+    """
+    Lowercases OCR text, replaces punctuation and symbols with spaces, drops stray
+    single letters and collapses whitespace, so scans of the same box produce the same string.
+    """
+    words = _NOISE.sub(" ", text.lower()).split()
+    return " ".join(word for word in words if len(word) > 1 or word.isdigit())
+
+
+def cache_key(text: str):
+    """Returns the cache key for an OCR text, or None if nothing is left after normalizing."""
+    normalized = normalize_ocr_text(text)
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _memory_get(key: str):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return result
+
+
+def _memory_set(key: str, result: dict, ttl_seconds: float):
+    with _memory_lock:
+        _memory[key] = (time.monotonic() + ttl_seconds, result)
+        _memory.move_to_end(key)
+        while len(_memory) > OCR_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+            _counters.increment("memory_evictions")
+
+
+async def _db_get(key: str):
+    """Returns (result, remaining ttl in seconds) from Postgres, or None."""
+    async with SessionLocal() as db:
+        row = (await db.execute(
+            update(ai_models.OcrAnalysisCache)
+            .where(
+                ai_models.OcrAnalysisCache.text_hash == key,
+                ai_models.OcrAnalysisCache.expires_at > datetime.now(timezone.utc)
+            )
+            .values(hit_count=ai_models.OcrAnalysisCache.hit_count + 1)
+            .returning(ai_models.OcrAnalysisCache.result, ai_models.OcrAnalysisCache.expires_at)
+        )).first()
+        await db.commit()
+        if row is None:
+            return None
+        return row.result, (row.expires_at - datetime.now(timezone.utc)).total_seconds()
+
+
+async def _db_set(key: str, result: dict, purge_expired: bool):
+    async with SessionLocal() as db:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=OCR_CACHE_TTL_SECONDS)
+        await db.execute(
+            insert(ai_models.OcrAnalysisCache)
+            .values(text_hash=key, result=result, expires_at=expires_at)
+            .on_conflict_do_update(
+                index_elements=[ai_models.OcrAnalysisCache.text_hash],
+                set_={"result": result, "expires_at": expires_at}
+            )
+        )
+        if purge_expired:
+            await db.execute(
+                delete(ai_models.OcrAnalysisCache)
+                .where(ai_models.OcrAnalysisCache.expires_at <= datetime.now(timezone.utc))
+            )
+        await db.commit()
+
+
+async def lookup(key: str):
+    """
+    Looks up an analysis in memory first, then in Postgres. Returns None on a
+    miss, and when Postgres cannot be reached: the cache never fails a request.
+    """
+    result = _memory_get(key)
+    if result is not None:
+        _counters.increment("memory_hits")
+        return result
+
+    try:
+        found = await _db_get(key)
+    except Exception as e:
+        _counters.increment("db_errors")
+        print(f"OCR cache lookup failed, treating it as a miss: {e}")
+        found = None
+    if found is None:
+        _counters.increment("misses")
+        return None
+
+    result, ttl_seconds = found
+    _memory_set(key, result, ttl_seconds)
+    _counters.increment("db_hits")
+    return result
+
+
+async def store(key: str, result: dict):
+    """Stores an analysis in both tiers; a failure to write to Postgres is only logged."""
+    _memory_set(key, result, OCR_CACHE_TTL_SECONDS)
+    _counters.increment("stores")
+    purge_expired = _counters.as_dict()["stores"] % OCR_CACHE_PURGE_EVERY == 0
+    try:
+        await _db_set(key, result, purge_expired)
+    except Exception as e:
+        _counters.increment("db_errors")
+        print(f"OCR cache store failed: {e}")
+
+
+def stats() -> dict:
+    values = _counters.as_dict()
+    lookups = values["memory_hits"] + values["db_hits"] + values["misses"]
+    with _memory_lock:
+        values["memory_entries"] = len(_memory)
+    values["hit_rate"] = round((values["memory_hits"] + values["db_hits"]) / lookups, 4) if lookups else 0.0
+    return values
+
+
+metrics.register("ocr_cache", stats)
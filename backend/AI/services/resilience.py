@@ -0,0 +1,229 @@
+# In AI/services/resilience.py
+# Retries, hedged requests and a circuit breaker around LLM provider calls.
+# ResilientProvider wraps the configured provider, so every AI call goes through it.
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from app.core import metrics
+from AI.services.llm_providers import LLMProvider, LLMProviderError, LLMResponse, PromptPrefix
+
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+# A duplicate request is sent when a call is still running after this
+# percentile of recent latencies, once enough calls have been seen
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# The circuit opens after this many consecutive failures and lets a trial call through after the reset time
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+_counters = metrics.Counters(
+    "calls", "failures", "retries", "hedges", "hedge_wins", "circuit_opened", "circuit_rejected"
+)
+
+
+class CircuitOpenError(LLMProviderError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+def is_transient(error: BaseException) -> bool:
+    return isinstance(error, LLMProviderError) and error.transient
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial call after the reset time."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                _counters.increment("circuit_rejected")
+                raise CircuitOpenError("The AI provider is unavailable, please try again shortly.")
+            # Half-open: let this one call through as a trial
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                _counters.increment("circuit_opened")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self):
+        """Called when a trial call is cancelled before it could succeed or fail."""
+        with self._lock:
+            self._trial_running = False
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one kind of call."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def _timed(make_call):
+    started = time.monotonic()
+    result = await make_call()
+    return result, time.monotonic() - started
+
+
+async def _hedged(make_call, tracker: LatencyTracker):
+    """
+    Runs the call; if it is still running after the tracked latency percentile,
+    starts a duplicate and returns whichever succeeds first.
+    """
+    hedge_after = tracker.percentile(LLM_HEDGE_PERCENTILE) if LLM_HEDGE_ENABLED else None
+    primary = asyncio.ensure_future(_timed(make_call))
+    tasks = {primary}
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                _counters.increment("hedges")
+                tasks.add(asyncio.ensure_future(_timed(make_call)))
+
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                winner = succeeded[0]
+                if winner is not primary:
+                    _counters.increment("hedge_wins")
+                result, seconds = winner.result()
+                tracker.record(seconds)
+                return result
+            if not pending:
+                # Every copy failed; report the primary's error
+                raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+class ResilientProvider(LLMProvider):
+    """
+    Wraps a provider with jittered retries on transient errors, hedged requests
+    for calls slower than the recent p95 and a circuit breaker that fails fast
+    while the provider is down. Streams are only retried before their first chunk.
+    """
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.name = provider.name
+        self.model_name = provider.model_name
+        self.breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+        self._latency = {"chat": LatencyTracker(), "json": LatencyTracker()}
+        metrics.register("llm_resilience", self.stats)
+
+    def _retrying(self):
+        def count_retry(retry_state):
+            _counters.increment("retries")
+
+        return AsyncRetrying(
+            stop=stop_after_attempt(LLM_RETRY_ATTEMPTS),
+            wait=wait_random_exponential(multiplier=0.5, max=8),
+            retry=retry_if_exception(is_transient),
+            before_sleep=count_retry,
+            reraise=True
+        )
+
+    async def _attempt(self, make_call):
+        self.breaker.before_call()
+        _counters.increment("calls")
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+        except Exception as e:
+            _counters.increment("failures")
+            # Errors such as a rejected prompt mean the provider itself is up
+            if is_transient(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def generate(self, contents, json_mode: bool = False, prefix: PromptPrefix = None) -> LLMResponse:
+        tracker = self._latency["json" if json_mode else "chat"]
+
+        def make_call():
+            return self.provider.generate(contents, json_mode=json_mode, prefix=prefix)
+
+        async for attempt in self._retrying():
+            with attempt:
+                return await self._attempt(lambda: _hedged(make_call, tracker))
+
+    async def generate_stream(self, contents, prefix: PromptPrefix = None, usage: dict = None):
+        stream = None
+        first_chunk = None
+
+        async def open_stream():
+            nonlocal stream, first_chunk
+            stream = self.provider.generate_stream(contents, prefix=prefix, usage=usage)
+            try:
+                first_chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                first_chunk = None
+
+        async for attempt in self._retrying():
+            with attempt:
+                await self._attempt(open_stream)
+
+        if first_chunk is None:
+            return
+        yield first_chunk
+        async for chunk in stream:
+            yield chunk
+
+    def stats(self) -> dict:
+        values = _counters.as_dict()
+        values["circuit_state"] = self.breaker.state
+        for kind, tracker in self._latency.items():
+            p95 = tracker.percentile(LLM_HEDGE_PERCENTILE)
+            values[f"{kind}_hedge_after_ms"] = round(p95 * 1000) if p95 is not None else None
+        return values
@@ -0,0 +1,195 @@
+# In AI/services/text_extraction.py
+# Text extraction from uploaded files. Extractors are registered per file_type
+# and run in a process pool, so parsing a large PDF uses another core instead
+# of holding the GIL of an API worker.
+# This module is imported by the pool's worker processes; keep its imports light.
+
+import os
+import io
+import mmap
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:
+    pytesseract = None
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60"))
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "200"))
+
+BINARY_PLACEHOLDER = " [Content is binary and cannot be displayed as simple text] "
+
+
+class ExtractionTimeoutError(ValueError):
+    pass
+
+
+class ExtractionCrashedError(ValueError):
+    pass
+
+
+# file_type -> function(stream, deadline) yielding the text of each page
+_EXTRACTORS = {}
+
+
+def extractor(*file_types):
+    """Registers the decorated function as the extractor of the given file types."""
+    def register(function):
+        for file_type in file_types:
+            _EXTRACTORS[file_type] = function
+        return function
+    return register
+
+
+def _check_deadline(deadline: float):
+    if time.monotonic() > deadline:
+        raise ExtractionTimeoutError("Text extraction took too long.")
+
+
+@extractor("text", "txt", "text/plain")
+def _extract_plain_text(stream, deadline):
+    content = stream.read()
+    try:
+        yield str(content, "utf-8")
+    except UnicodeDecodeError:
+        yield BINARY_PLACEHOLDER
+
+
+if PdfReader is not None:
+    @extractor("pdf", "application/pdf")
+    def _extract_pdf(stream, deadline):
+        # Pages are parsed one at a time, only as far as the page limit
+        for page in PdfReader(stream).pages:
+            _check_deadline(deadline)
+            yield page.extract_text() or ""
+
+
+if pytesseract is not None:
+    @extractor("image", "image/jpeg", "image/png")
+    def _extract_image(stream, deadline):
+        yield pytesseract.image_to_string(Image.open(stream), timeout=max(deadline - time.monotonic(), 1))
+
+
+def _sniff_file_type(stream) -> str:
+    """
+    Recognises PDFs and images uploaded without a format as file_type: none at
+    all, a generic one, or a category such as 'lab_report'.
+    """
+    start = stream.read(8)
+    stream.seek(0)
+    if start.startswith(b"%PDF-"):
+        return "pdf"
+    if start.startswith((b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff")):
+        return "image"
+    return "text"
+
+
+def _open_source(source):
+    """Returns a read-only stream over bytes, or over a memory map of the file at a path."""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    with open(source, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return io.BytesIO(b"")
+        # The map stays valid after the file is closed
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _run_extractor(source, file_type: str, timeout: float, max_pages: int) -> str:
+    """Runs in a worker process: extracts the pages of one file up to the page limit."""
+    deadline = time.monotonic() + timeout
+    stream = _open_source(source)
+    try:
+        extract = _EXTRACTORS.get(file_type) or _EXTRACTORS.get(_sniff_file_type(stream)) or _extract_plain_text
+        pages = []
+        for page_text in extract(stream, deadline):
+            pages.append(page_text)
+            if len(pages) >= max_pages:
+                break
+        return "\n\n".join(pages)
+    finally:
+        stream.close()
+
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Forking would copy the API process with its threads and connections
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def _replace_executor(executor: ProcessPoolExecutor, terminate: bool = False):
+    """
+    Drops a broken (or stuck) pool so the next extraction starts a new one.
+    With `terminate`, its worker processes are killed, failing the other
+    extractions they run with BrokenProcessPool (which retries them).
+    """
+    global _executor
+    if _executor is executor:
+        _executor = None
+    if terminate:
+        # ProcessPoolExecutor has no public way to stop a busy worker before Python 3.14
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _extract_once(source, file_type: str) -> str:
+    executor = _get_executor()
+    try:
+        future = executor.submit(
+            _run_extractor, source, file_type, EXTRACTION_TIMEOUT_SECONDS, EXTRACTION_MAX_PAGES
+        )
+        # The extractor stops itself at the deadline between pages; the margin covers pool start-up
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=EXTRACTION_TIMEOUT_SECONDS + 10)
+    except BrokenProcessPool:
+        _replace_executor(executor)
+        raise
+    except asyncio.TimeoutError:
+        # A single page is still running: stop its worker instead of leaving it busy
+        _replace_executor(executor, terminate=True)
+        raise ExtractionTimeoutError("Text extraction took too long.")
+
+
+async def extract_text(source, file_type: str) -> str:
+    """
+    Extracts the text of a file given as bytes or as the path of a file on disk,
+    in a pool process: at most EXTRACTION_MAX_PAGES pages and
+    EXTRACTION_TIMEOUT_SECONDS. Scanned PDFs without a text layer yield no
+    text; images are only read when pytesseract is installed. When a worker
+    process dies, the pool is rebuilt and the file is tried once more.
+    """
+    file_type = (file_type or "").lower()
+    try:
+        return await _extract_once(source, file_type)
+    except BrokenProcessPool:
+        pass
+    try:
+        return await _extract_once(source, file_type)
+    except BrokenProcessPool:
+        raise ExtractionCrashedError("Text extraction crashed on this file.")
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, text, TIMESTAMP, Time
+from sqlalchemy import Column, String, ForeignKey, Index, text, TIMESTAMP, Time
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -22,6 +22,9 @@ class Dose(Base):
     quantity = Column(String, nullable=False, default="1 pill")
     
     created_at = Column(TIMESTAMP(timezone=True), server_default=text('now()'))
+
+    # The doses of a medicine in the order of the day
+    __table_args__ = (Index("ix_doses_user_medicine_id_dose_time", user_medicine_id, dose_time),)
     
     # This relationship lets us easily access the UserMedicine object from a Dose object
     user_medicine = relationship("UserMedicine")
\ No newline at end of file
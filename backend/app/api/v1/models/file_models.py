@@ -1,13 +1,35 @@
 # In app/api/v1/models/file_models.py
 
-from sqlalchemy import Column, String, ForeignKey, text, TIMESTAMP
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, ForeignKey, Index, Integer, LargeBinary, UniqueConstraint, text, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.api.v1.models.profile_models import Profile
 
+class DocumentText(Base):
+    """
+    Extracted text of a file's content, stored once per content hash however
+    many users upload the same file. See AI/services/document_store.py.
+    """
+    __tablename__ = "document_texts"
+    __table_args__ = (Index("ix_document_texts_search_vector", "search_vector", postgresql_using="gin"),)
+
+    content_hash = Column(String, primary_key=True) # SHA-256 of the file content
+    codec = Column(String, nullable=False) # 'zstd', 'zlib' or 'plain'
+    compressed_text = Column(LargeBinary, nullable=False)
+    text_length = Column(Integer, nullable=False) # Characters of the decompressed text
+    text_index = Column(JSONB) # Chunk offsets and BM25 statistics over the text
+    search_vector = Column(TSVECTOR) # Full-text search terms of the text
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # A user has one record per file content; other users share the text
+        UniqueConstraint("user_id", "file_hash", name="uq_files_user_id_file_hash"),
+        # A user's files, newest first, without sorting
+        Index("ix_files_user_id_uploaded_at", "user_id", text("uploaded_at DESC")),
+    )
 
     file_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("profiles.id"), nullable=False)
@@ -16,8 +38,24 @@ class File(Base):
     file_type = Column(String) # e.g., 'pdf', 'image', 'lab_report'
     description = Column(String)
     uploaded_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
-    file_hash = Column(String, unique=True, index=True) # The unique fingerprint
-    extracted_text = Column(String) # The content of the document
+    file_hash = Column(String, ForeignKey("document_texts.content_hash"), index=True) # The content fingerprint
 
     # Define a relationship to easily access the owner's profile
-    owner = relationship("Profile")
\ No newline at end of file
+    owner = relationship("Profile")
+    # Loaded only when the text is needed (chat, processing results)
+    document = relationship("DocumentText")
+
+class FileJob(Base):
+    """A queued or finished run of file processing, polled by the client."""
+    __tablename__ = "file_jobs"
+
+    job_id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("profiles.id"), nullable=False)
+    request = Column(JSONB, nullable=False) # The FileProcessRequest to run
+    status = Column(String, nullable=False, server_default='queued', index=True) # queued, running, succeeded, failed
+    stage = Column(String) # Progress while running: downloading, extracting, saving
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.file_id")) # Set once succeeded
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, server_default=text('0'))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
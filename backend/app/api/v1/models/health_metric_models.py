@@ -1,6 +1,6 @@
 # In app/api/v1/models/health_metric_models.py
 
-from sqlalchemy import Column, String, ForeignKey, text, TIMESTAMP
+from sqlalchemy import Column, String, ForeignKey, Index, text, TIMESTAMP
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -19,6 +19,9 @@ class HealthMetric(Base):
 
     timestamp = Column("timestamp", TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
+    # A user's metrics, newest first, without sorting
+    __table_args__ = (Index("ix_health_metrics_user_id_timestamp", user_id, timestamp.desc()),)
+
     # Define a relationship to easily access the owner's profile
     owner = relationship("Profile")
     
@@ -1,6 +1,6 @@
 # In app/api/v1/models/medicine_models.py
 
-from sqlalchemy import Column, String, Date, Boolean, ForeignKey, text
+from sqlalchemy import Column, String, Date, Boolean, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -25,6 +25,8 @@ class Medicine(Base):
 # This model links a specific user to a specific medicine from the master list
 class UserMedicine(Base):
     __tablename__ = "user_medicines"
+    # Every medicine list and permission check looks a user's medicines up
+    __table_args__ = (Index("ix_user_medicines_user_id", "user_id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("profiles.id"), nullable=False)
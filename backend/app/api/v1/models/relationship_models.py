@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, text, UniqueConstraint
+from sqlalchemy import Column, String, ForeignKey, Index, text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -18,8 +18,12 @@ class UserRelationship(Base):
     relation = Column(String, nullable=False)  # e.g., 'father', 'daughter'
     permission = Column(String, nullable=False, default='viewer') # e.g., 'viewer', 'editor'
 
-    # This constraint ensures you can't add the same person twice
-    __table_args__ = (UniqueConstraint('user_id', 'related_user_id', name='_user_related_user_uc'),)
+    __table_args__ = (
+        # This constraint ensures you can't add the same person twice
+        UniqueConstraint('user_id', 'related_user_id', name='_user_related_user_uc'),
+        # Who has added this user (the constraint above only covers lookups by user_id)
+        Index("ix_user_relationships_related_user_id", "related_user_id"),
+    )
 
     # Define relationships to easily access the full profile objects
     user = relationship("Profile", foreign_keys=[user_id])
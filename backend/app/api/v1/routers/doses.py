@@ -1,26 +1,19 @@
 from fastapi import APIRouter, Depends, status, HTTPException, Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.models import dose_models, medicine_models, relationship_models
 from app.api.v1.schemas import dose_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 
 router = APIRouter()
 
-# Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # --- Helper Function to Check Permissions ---
-def get_medicine_and_check_permission(
-    db: Session, 
+async def get_medicine_and_check_permission(
+    db: AsyncSession, 
     user_medicine_id: uuid.UUID, 
     admin_id: uuid.UUID, 
     permission_level: str = 'viewer'
@@ -30,9 +23,9 @@ def get_medicine_and_check_permission(
     for a specific UserMedicine object.
     """
     # 1. Get the UserMedicine object
-    user_medicine = db.query(medicine_models.UserMedicine).filter(
+    user_medicine = await db.scalar(select(medicine_models.UserMedicine).where(
         medicine_models.UserMedicine.id == user_medicine_id
-    ).first()
+    ))
 
     if not user_medicine:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Medicine not found")
@@ -46,11 +39,11 @@ def get_medicine_and_check_permission(
     if permission_level == 'viewer':
         required_permissions.append('viewer') # For 'viewer', both 'viewer' and 'editor' are ok
 
-    permission = db.query(relationship_models.UserRelationship).filter(
+    permission = await db.scalar(select(relationship_models.UserRelationship).where(
         relationship_models.UserRelationship.user_id == admin_id,
         relationship_models.UserRelationship.related_user_id == user_medicine.user_id,
         relationship_models.UserRelationship.permission.in_(required_permissions)
-    ).first()
+    ))
 
     if not permission:
         raise HTTPException(
@@ -64,9 +57,9 @@ def get_medicine_and_check_permission(
 # --- API Endpoints ---
 
 @router.post("/", response_model=dose_schemas.Dose, status_code=status.HTTP_201_CREATED)
-def create_dose_for_medicine(
+async def create_dose_for_medicine(
     dose_data: dose_schemas.DoseCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -76,7 +69,7 @@ def create_dose_for_medicine(
     admin_id = uuid.UUID(current_user.user_id)
     
     # Check if the user has 'editor' permission for this medicine
-    get_medicine_and_check_permission(
+    await get_medicine_and_check_permission(
         db, 
         user_medicine_id=dose_data.user_medicine_id, 
         admin_id=admin_id, 
@@ -86,15 +79,15 @@ def create_dose_for_medicine(
     # Permission granted, create the dose
     new_dose = dose_models.Dose(**dose_data.dict())
     db.add(new_dose)
-    db.commit()
-    db.refresh(new_dose)
+    await db.commit()
+    await db.refresh(new_dose)
     return new_dose
 
 
 @router.get("/for-medicine/{user_medicine_id}", response_model=List[dose_schemas.Dose])
-def get_doses_for_medicine(
+async def get_doses_for_medicine(
     user_medicine_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -104,7 +97,7 @@ def get_doses_for_medicine(
     admin_id = uuid.UUID(current_user.user_id)
     
     # Check if user has 'viewer' permission for this medicine
-    get_medicine_and_check_permission(
+    await get_medicine_and_check_permission(
         db, 
         user_medicine_id=user_medicine_id, 
         admin_id=admin_id, 
@@ -112,19 +105,21 @@ def get_doses_for_medicine(
     )
 
     # Permission granted, get the doses
-    doses = db.query(dose_models.Dose).filter(
-        dose_models.Dose.user_medicine_id == user_medicine_id
-    ).order_by(dose_models.Dose.dose_time).all()
+    doses = (await db.scalars(
+        select(dose_models.Dose)
+        .where(dose_models.Dose.user_medicine_id == user_medicine_id)
+        .order_by(dose_models.Dose.dose_time)
+    )).all()
     
     return doses
 
 # ... (after the get_doses_for_medicine function)
 
 @router.put("/{dose_id}", response_model=dose_schemas.Dose)
-def update_dose(
+async def update_dose(
     dose_id: uuid.UUID,
     dose_update: dose_schemas.DoseUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -134,12 +129,12 @@ def update_dose(
     admin_id = uuid.UUID(current_user.user_id)
 
     # 1. Get the dose from the DB
-    db_dose = db.query(dose_models.Dose).filter(dose_models.Dose.dose_id == dose_id).first()
+    db_dose = await db.scalar(select(dose_models.Dose).where(dose_models.Dose.dose_id == dose_id))
     if not db_dose:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dose not found")
 
     # 2. Check if user has 'editor' permission for the parent medicine
-    get_medicine_and_check_permission(
+    await get_medicine_and_check_permission(
         db, 
         user_medicine_id=db_dose.user_medicine_id, 
         admin_id=admin_id, 
@@ -153,15 +148,15 @@ def update_dose(
     for key, value in update_data.items():
         setattr(db_dose, key, value)
         
-    db.commit()
-    db.refresh(db_dose)
+    await db.commit()
+    await db.refresh(db_dose)
     
     return db_dose
 
 @router.delete("/{dose_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_dose(
+async def delete_dose(
     dose_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -171,12 +166,12 @@ def delete_dose(
     admin_id = uuid.UUID(current_user.user_id)
 
     # 1. Get the dose
-    db_dose = db.query(dose_models.Dose).filter(dose_models.Dose.dose_id == dose_id).first()
+    db_dose = await db.scalar(select(dose_models.Dose).where(dose_models.Dose.dose_id == dose_id))
     if not db_dose:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dose not found")
 
     # 2. Check if user has 'editor' permission for the *parent medicine*
-    get_medicine_and_check_permission(
+    await get_medicine_and_check_permission(
         db, 
         user_medicine_id=db_dose.user_medicine_id, 
         admin_id=admin_id, 
@@ -184,6 +179,6 @@ def delete_dose(
     )
     
     # 3. Permission granted, delete the dose
-    db.delete(db_dose)
-    db.commit()
+    await db.delete(db_dose)
+    await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
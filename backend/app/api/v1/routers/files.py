@@ -1,29 +1,23 @@
 # In app/api/v1/routers/files.py
 
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 # Corrected import
 from app.api.v1.models import file_models
 from app.api.v1.schemas import file_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
+from AI.services import document_store
 
 router = APIRouter() # Corrected typo here
 
-# Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=file_schemas.File, status_code=status.HTTP_201_CREATED)
-def create_file_record(
+async def create_file_record(
     file_data: file_schemas.FileCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -37,20 +31,47 @@ def create_file_record(
         description=file_data.description
     )
     db.add(new_file_record)
-    db.commit()
-    db.refresh(new_file_record)
+    await db.commit()
+    await db.refresh(new_file_record)
     return new_file_record
 
 
 @router.get("/", response_model=List[file_schemas.File])
-def get_files_for_user(
-    db: Session = Depends(get_db),
+async def get_files_for_user(
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Get a list of all file records for the authenticated user.
     """
-    files = db.query(file_models.File).filter(
-        file_models.File.user_id == current_user.user_id
-    ).order_by(file_models.File.uploaded_at.desc()).all()
-    return files
\ No newline at end of file
+    files = (await db.scalars(
+        select(file_models.File)
+        .where(file_models.File.user_id == current_user.user_id)
+        .order_by(file_models.File.uploaded_at.desc())
+    )).all()
+    return files
+
+
+@router.get("/search", response_model=List[file_schemas.FileSearchResult])
+async def search_files(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """
+    Full-text search over the text of the authenticated user's processed files.
+    Returns the matching files, best match first, with a snippet of each.
+    """
+    matches = await document_store.search(db, current_user.user_id, q, limit)
+    return [
+        file_schemas.FileSearchResult(
+            file_id=file_record.file_id,
+            file_type=file_record.file_type,
+            description=file_record.description,
+            uploaded_at=file_record.uploaded_at,
+            rank=rank,
+            snippet=document_store.snippet(document_store.load_text(document), q)
+        )
+        for file_record, document, rank in matches
+    ]
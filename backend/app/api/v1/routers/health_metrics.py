@@ -1,29 +1,22 @@
 # In app/api/v1/routers/health_metrics.py
 
 from fastapi import APIRouter, Depends, status, HTTPException, Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.models import health_metric_models
 from app.api.v1.schemas import health_metric_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 
 router = APIRouter()
 
-# Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=health_metric_schemas.HealthMetric, status_code=status.HTTP_201_CREATED)
-def create_health_metric(
+async def create_health_metric(
     metric_data: health_metric_schemas.HealthMetricCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -37,32 +30,34 @@ def create_health_metric(
         timestamp=metric_data.timestamp  # Use timestamp from user if provided
     )
     db.add(new_metric)
-    db.commit()
-    db.refresh(new_metric)
+    await db.commit()
+    await db.refresh(new_metric)
     return new_metric
 
 
 @router.get("/", response_model=List[health_metric_schemas.HealthMetric])
-def get_health_metrics(
-    db: Session = Depends(get_db),
+async def get_health_metrics(
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Get a list of all health metrics for the authenticated user.
     """
-    metrics = db.query(health_metric_models.HealthMetric).filter(
-        health_metric_models.HealthMetric.user_id == current_user.user_id
-    ).order_by(health_metric_models.HealthMetric.timestamp.desc()).all()
+    metrics = (await db.scalars(
+        select(health_metric_models.HealthMetric)
+        .where(health_metric_models.HealthMetric.user_id == current_user.user_id)
+        .order_by(health_metric_models.HealthMetric.timestamp.desc())
+    )).all()
     return metrics
 
 @router.put("/{metric_id}", response_model=health_metric_schemas.HealthMetric)
-def update_health_metric(
+async def update_health_metric(
     metric_id: uuid.UUID,
     metric_update: health_metric_schemas.HealthMetricUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    db_metric = db.query(health_metric_models.HealthMetric).filter(health_metric_models.HealthMetric.metric_id == metric_id).first()
+    db_metric = await db.scalar(select(health_metric_models.HealthMetric).where(health_metric_models.HealthMetric.metric_id == metric_id))
     
     if not db_metric:
         raise HTTPException(status_code=404, detail="Metric not found")
@@ -73,24 +68,24 @@ def update_health_metric(
     for key, value in update_data.items():
         setattr(db_metric, key, value)
         
-    db.commit()
-    db.refresh(db_metric)
+    await db.commit()
+    await db.refresh(db_metric)
     return db_metric
 
 # --- DELETE ENDPOINT ---
 @router.delete("/{metric_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_health_metric(
+async def delete_health_metric(
     metric_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    db_metric = db.query(health_metric_models.HealthMetric).filter(health_metric_models.HealthMetric.metric_id == metric_id).first()
+    db_metric = await db.scalar(select(health_metric_models.HealthMetric).where(health_metric_models.HealthMetric.metric_id == metric_id))
     
     if not db_metric:
         raise HTTPException(status_code=404, detail="Metric not found")
     if db_metric.user_id != uuid.UUID(current_user.user_id):
         raise HTTPException(status_code=403, detail="Not authorized to delete this metric")
         
-    db.delete(db_metric)
-    db.commit()
+    await db.delete(db_metric)
+    await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
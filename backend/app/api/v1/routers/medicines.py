@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
 import uuid
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.models import medicine_models
 from app.api.v1.schemas import medicine_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
@@ -12,42 +13,45 @@ from app.api.v1.models import relationship_models
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=medicine_schemas.UserMedicine, status_code=status.HTTP_201_CREATED)
-def add_medicine_for_user(user_medicine: medicine_schemas.UserMedicineCreate, db: Session = Depends(get_db), current_user: TokenData = Depends(get_current_user)):
+async def add_medicine_for_user(user_medicine: medicine_schemas.UserMedicineCreate, db: AsyncSession = Depends(get_db), current_user: TokenData = Depends(get_current_user)):
     stmt = select(medicine_models.Medicine).where(medicine_models.Medicine.name.ilike(user_medicine.medicine_name))
-    db_medicine = db.execute(stmt).scalars().first()
+    db_medicine = (await db.execute(stmt)).scalars().first()
     if db_medicine is None:
         db_medicine = medicine_models.Medicine(name=user_medicine.medicine_name, manufacturer=user_medicine.manufacturer)
         db.add(db_medicine)
-        db.commit()
-        db.refresh(db_medicine)
+        await db.commit()
+        await db.refresh(db_medicine)
     new_user_medicine = medicine_models.UserMedicine(user_id=current_user.user_id, medicine_id=db_medicine.medicine_id, **user_medicine.dict(exclude={"medicine_name", "manufacturer"}))
     db.add(new_user_medicine)
-    db.commit()
-    db.refresh(new_user_medicine)
+    await db.commit()
+    await db.refresh(new_user_medicine)
+    # The response includes the medicine's details
+    await db.refresh(new_user_medicine, ["medicine"])
     return new_user_medicine
 
 @router.get("/", response_model=List[medicine_schemas.UserMedicine])
-def get_medicines_for_user(db: Session = Depends(get_db), current_user: TokenData = Depends(get_current_user)):
-    user_medicines = db.query(medicine_models.UserMedicine).filter(medicine_models.UserMedicine.user_id == current_user.user_id).all()
+async def get_medicines_for_user(db: AsyncSession = Depends(get_read_db), current_user: TokenData = Depends(get_current_user)):
+    user_medicines = (await db.scalars(
+        select(medicine_models.UserMedicine)
+        .options(selectinload(medicine_models.UserMedicine.medicine))
+        .where(medicine_models.UserMedicine.user_id == current_user.user_id)
+    )).all()
     return user_medicines
 
 # --- UPDATE ENDPOINT ---
 @router.put("/{user_medicine_id}", response_model=medicine_schemas.UserMedicine)
-def update_user_medicine(
+async def update_user_medicine(
     user_medicine_id: uuid.UUID,
     medicine_update: medicine_schemas.UserMedicineUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    db_user_medicine = db.query(medicine_models.UserMedicine).filter(medicine_models.UserMedicine.id == user_medicine_id).first()
+    db_user_medicine = await db.scalar(
+        select(medicine_models.UserMedicine)
+        .options(selectinload(medicine_models.UserMedicine.medicine))
+        .where(medicine_models.UserMedicine.id == user_medicine_id)
+    )
     if not db_user_medicine:
         raise HTTPException(status_code=404, detail="Medicine entry not found")
     if db_user_medicine.user_id != uuid.UUID(current_user.user_id):
@@ -57,23 +61,22 @@ def update_user_medicine(
     for key, value in update_data.items():
         setattr(db_user_medicine, key, value)
         
-    db.commit()
-    db.refresh(db_user_medicine)
+    await db.commit()
     return db_user_medicine
 
 # --- DELETE ENDPOINT ---
 @router.delete("/{user_medicine_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_medicine(
+async def delete_user_medicine(
     user_medicine_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
-    db_user_medicine = db.query(medicine_models.UserMedicine).filter(medicine_models.UserMedicine.id == user_medicine_id).first()
+    db_user_medicine = await db.scalar(select(medicine_models.UserMedicine).where(medicine_models.UserMedicine.id == user_medicine_id))
     if not db_user_medicine:
         raise HTTPException(status_code=404, detail="Medicine entry not found")
     if db_user_medicine.user_id != uuid.UUID(current_user.user_id):
         raise HTTPException(status_code=403, detail="Not authorized to delete this medicine entry")
         
-    db.delete(db_user_medicine)
-    db.commit()
+    await db.delete(db_user_medicine)
+    await db.commit()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
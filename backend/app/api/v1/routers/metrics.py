@@ -0,0 +1,16 @@
+# In app/api/v1/routers/metrics.py
+
+from fastapi import APIRouter, Depends
+
+from app.core import metrics
+from app.api.v1.dependencies.auth import get_current_user, TokenData
+
+router = APIRouter()
+
+@router.get("/")
+def get_metrics(current_user: TokenData = Depends(get_current_user)):
+    """
+    Returns the in-process metrics (caches, AI calls, database pool, ...) of the
+    worker that handles the request.
+    """
+    return metrics.snapshot()
@@ -1,45 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.models import profile_models
 from app.api.v1.schemas import profile_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 
 router = APIRouter()
 
-# Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/me", response_model=profile_schemas.Profile)
-def read_current_user_profile(
+async def read_current_user_profile(
     current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get the profile of the currently authenticated user.
     """
-    profile = db.query(profile_models.Profile).filter(profile_models.Profile.id == current_user.user_id).first()
+    profile = await db.scalar(select(profile_models.Profile).where(profile_models.Profile.id == current_user.user_id))
     return profile
 
 @router.put("/me", response_model=profile_schemas.Profile)
-def update_current_user_profile(
+async def update_current_user_profile(
     profile_update: profile_schemas.ProfileUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Update the profile for the currently authenticated user.
     """
     # Get the user's current profile from the database
-    profile = db.query(profile_models.Profile).filter(profile_models.Profile.id == uuid.UUID(current_user.user_id)).first()
+    profile = await db.scalar(select(profile_models.Profile).where(profile_models.Profile.id == uuid.UUID(current_user.user_id)))
     
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -51,19 +44,19 @@ def update_current_user_profile(
     for key, value in update_data.items():
         setattr(profile, key, value)
         
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     return profile
 
 
 @router.get("/", response_model=List[profile_schemas.Profile])
-def read_all_profiles(
-    db: Session = Depends(get_db),
+async def read_all_profiles(
+    db: AsyncSession = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100
 ):
     """
     Retrieve a list of all user profiles.
     """
-    profiles = db.query(profile_models.Profile).offset(skip).limit(limit).all()
+    profiles = (await db.scalars(select(profile_models.Profile).offset(skip).limit(limit))).all()
     return profiles
\ No newline at end of file
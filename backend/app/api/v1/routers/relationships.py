@@ -1,30 +1,23 @@
 # In app/api/v1/routers/relationships.py
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import text 
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
 import uuid
 
-from app.core.database import SessionLocal
+from app.core.database import get_db, get_read_db
 from app.api.v1.models import profile_models, relationship_models
 from app.api.v1.schemas import relationship_schemas
 from app.api.v1.dependencies.auth import get_current_user, TokenData
 
 router = APIRouter()
 
-# Dependency to get a database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=relationship_schemas.Relationship, status_code=status.HTTP_201_CREATED)
-def add_relationship(
+async def add_relationship(
     relationship_data: relationship_schemas.RelationshipCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
@@ -32,7 +25,7 @@ def add_relationship(
     """
     # Find the profile of the user to be added by their email
     stmt = text("SELECT * FROM get_profile_by_email(:email)")
-    related_user_profile = db.execute(stmt, {"email": relationship_data.related_user_email}).first()
+    related_user_profile = (await db.execute(stmt, {"email": relationship_data.related_user_email})).first()
 
     if not related_user_profile:
         raise HTTPException(status_code=404, detail="User with the specified email not found.")
@@ -42,10 +35,10 @@ def add_relationship(
         raise HTTPException(status_code=400, detail="You cannot add yourself as a family member.")
 
     # Check if the relationship already exists
-    existing_relationship = db.query(relationship_models.UserRelationship).filter(
+    existing_relationship = await db.scalar(select(relationship_models.UserRelationship).where(
         relationship_models.UserRelationship.user_id == current_user.user_id,
         relationship_models.UserRelationship.related_user_id == related_user_profile.id
-    ).first()
+    ))
 
     if existing_relationship:
         raise HTTPException(status_code=400, detail="This user is already in your family list.")
@@ -58,21 +51,25 @@ def add_relationship(
         permission=relationship_data.permission
     )
     db.add(new_relationship)
-    db.commit()
-    db.refresh(new_relationship)
+    await db.commit()
+    await db.refresh(new_relationship)
+    # The response includes the related user's profile
+    await db.refresh(new_relationship, ["related_user"])
 
     return new_relationship
 
 
 @router.get("/", response_model=List[relationship_schemas.Relationship])
-def get_relationships(
-    db: Session = Depends(get_db),
+async def get_relationships(
+    db: AsyncSession = Depends(get_read_db),
     current_user: TokenData = Depends(get_current_user)
 ):
     """
     Get a list of all family members for the authenticated user.
     """
-    relationships = db.query(relationship_models.UserRelationship).filter(
-        relationship_models.UserRelationship.user_id == current_user.user_id
-    ).all()
+    relationships = (await db.scalars(
+        select(relationship_models.UserRelationship)
+        .options(selectinload(relationship_models.UserRelationship.related_user))
+        .where(relationship_models.UserRelationship.user_id == current_user.user_id)
+    )).all()
     return relationships
\ No newline at end of file
@@ -37,7 +37,24 @@ class FileProcessResponse(BaseModel):
     file_id: uuid.UUID
     extracted_text: str
 
+# Status of a file processing job; `result` is set once it has succeeded
+class FileJobResponse(BaseModel):
+    job_id: Optional[uuid.UUID] = None # None when the file was processed before
+    status: str
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[FileProcessResponse] = None
+
 # Data the frontend sends to chat about a processed file
 class FileChatRequest(BaseModel):
     file_id: uuid.UUID
-    prompt: str
\ No newline at end of file
+    prompt: str
+
+# One processed file matching a search, best match first
+class FileSearchResult(BaseModel):
+    file_id: uuid.UUID
+    file_type: Optional[str] = None
+    description: Optional[str] = None
+    uploaded_at: datetime
+    rank: float
+    snippet: str
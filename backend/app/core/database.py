@@ -1,25 +1,195 @@
 # In app/core/database.py
 
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 import os
+import hmac
+import time
+import hashlib
+import threading
 from dotenv import load_dotenv
 
+from app.core import db_pool, metrics, sql_profiler
+
 load_dotenv()
 
 # Get the database URL from your .env file
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-# We are adding pool configuration to the create_engine call
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_size=5,          # Limit the number of connections in the pool
-    max_overflow=2,       # Allow 2 extra connections in case of a spike
-    pool_recycle=300,     # Recycle connections every 300 seconds (5 minutes)
-    pool_pre_ping=True    # Check if a connection is alive before using it
+
+def _async_database_url(database_url: str):
+    """
+    Returns (URL for the asyncpg driver, connect args). asyncpg takes the SSL
+    mode as an argument instead of the libpq 'sslmode' query parameter.
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    connect_args = {
+        # Set DATABASE_STATEMENT_CACHE_SIZE=0 behind PgBouncer in transaction mode (e.g. Supabase's pooler on port 6543)
+        "statement_cache_size": int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100")),
+    }
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"])
+        connect_args["ssl"] = sslmode
+    return url, connect_args
+
+
+# Optional read replica; read-only handlers use it through get_read_db
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# After a write, the same client reads from the primary this long, so replication lag never hides its own writes
+DATABASE_READ_YOUR_WRITES_SECONDS = float(os.getenv("DATABASE_READ_YOUR_WRITES_SECONDS", "10"))
+# Signs the pins handed to clients (see pin_client), so that every worker can check them
+DATABASE_PIN_SECRET = os.getenv("DATABASE_PIN_SECRET") or os.getenv("SUPABASE_JWT_SECRET")
+if DATABASE_REPLICA_URL and not DATABASE_PIN_SECRET:
+    raise RuntimeError("DATABASE_REPLICA_URL is set, but DATABASE_PIN_SECRET (or SUPABASE_JWT_SECRET) is not; it signs the read-your-writes pins.")
+
+# Connection pool settings, per worker process and engine
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+# Extra connections allowed during a spike
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "2"))
+# How long a request waits for a free connection before failing
+DATABASE_POOL_TIMEOUT_SECONDS = float(os.getenv("DATABASE_POOL_TIMEOUT_SECONDS", "30"))
+# Connections older than this are replaced
+DATABASE_POOL_RECYCLE_SECONDS = int(os.getenv("DATABASE_POOL_RECYCLE_SECONDS", "300"))
+# Check that a connection is alive before using it
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "true").lower() == "true"
+
+
+def _create_engine(database_url: str, metrics_name: str):
+    """An async engine with the configured pool (reported under `metrics_name`) and the SQL profiler."""
+    url, connect_args = _async_database_url(database_url)
+    pool_stats = db_pool.PoolStats()
+    new_engine = create_async_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=db_pool.pool_class(pool_stats),
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DATABASE_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=DATABASE_POOL_PRE_PING
+    )
+    db_pool.register(metrics_name, new_engine, pool_stats)
+    sql_profiler.install(new_engine)
+    return new_engine
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL, "db_pool")
+replica_engine = _create_engine(DATABASE_REPLICA_URL, "db_pool_replica") if DATABASE_REPLICA_URL else None
+
+# Objects stay usable after commit; nothing is loaded lazily behind an await
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReplicaSessionLocal = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if replica_engine is not None else None
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+_routing_counters = metrics.Counters("replica_reads", "primary_reads", "pinned_reads")
+# The pin goes back to the client as a cookie and a header; either one may be sent back
+PIN_COOKIE = "db_read_primary"
+PIN_HEADER = "X-DB-Read-Primary"
+_pinned_until = {}  # client key -> monotonic time until which it reads from the primary (this worker only)
+_pins_lock = threading.Lock()
+
+
+def _client_key(request: Request):
+    """Identifies the client by its bearer token (hashed), or None without one."""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+
+
+def _pin_to_primary(key):
+    if key is None or ReplicaSessionLocal is None:
+        return
+    now = time.monotonic()
+    with _pins_lock:
+        _pinned_until[key] = now + DATABASE_READ_YOUR_WRITES_SECONDS
+        # Forget expired pins once in a while
+        if len(_pinned_until) > 1000:
+            for expired in [k for k, until in _pinned_until.items() if until <= now]:
+                del _pinned_until[expired]
+
+
+def _is_pinned(key) -> bool:
+    if key is None:
+        return False
+    with _pins_lock:
+        return _pinned_until.get(key, 0) > time.monotonic()
+
+
+def _pin_signature(key: str, until: int) -> str:
+    return hmac.new(DATABASE_PIN_SECRET.encode("utf-8"), f"{key}:{until}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def pin_client(request: Request, response):
+    """
+    Hands a writing client a signed pin holding the (wall clock) time until which
+    it reads from the primary. Unlike the in-memory pin, which only the worker
+    that handled the write knows about, any worker can check it. Called by the
+    middleware in main.py once the response is ready.
+    """
+    if ReplicaSessionLocal is None or request.method in _SAFE_METHODS:
+        return
+    key = _client_key(request)
+    if key is None:
+        return
+    until = int(time.time() + DATABASE_READ_YOUR_WRITES_SECONDS) + 1
+    pin = f"{until}.{_pin_signature(key, until)}"
+    response.headers[PIN_HEADER] = pin
+    response.set_cookie(PIN_COOKIE, pin, max_age=int(DATABASE_READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite="lax")
+
+
+def _has_pin(request: Request, key) -> bool:
+    """Whether the request carries an unexpired pin issued to this client."""
+    pin = request.headers.get(PIN_HEADER) or request.cookies.get(PIN_COOKIE)
+    if key is None or not pin:
+        return False
+    until, _, signature = pin.partition(".")
+    if not until.isdigit() or int(until) <= time.time():
+        return False
+    return hmac.compare_digest(signature, _pin_signature(key, int(until)))
+
+
+async def get_db(request: Request):
+    """
+    FastAPI dependency: a session on the primary, closed when the request is
+    done. A writing request pins its client to the primary (see get_read_db)
+    on this worker while it runs and for DATABASE_READ_YOUR_WRITES_SECONDS
+    after; pin_client extends that to the other workers.
+    """
+    key = _client_key(request) if request.method not in _SAFE_METHODS else None
+    _pin_to_primary(key)
+    async with SessionLocal() as db:
+        yield db
+    _pin_to_primary(key)
+
+
+async def get_read_db(request: Request):
+    """
+    FastAPI dependency for read-only handlers: a session on the read replica,
+    or on the primary when there is no replica or the client wrote recently
+    (it sends back a pin from pin_client, or this worker handled the write).
+    Nothing may be written through it.
+    """
+    session_factory = SessionLocal
+    key = _client_key(request)
+    if ReplicaSessionLocal is None or request.method not in _SAFE_METHODS:
+        _routing_counters.increment("primary_reads")
+    elif _is_pinned(key) or _has_pin(request, key):
+        _routing_counters.increment("pinned_reads")
+    else:
+        _routing_counters.increment("replica_reads")
+        session_factory = ReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+metrics.register("db_routing", _routing_counters.as_dict)
+
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -0,0 +1,111 @@
+# In app/core/db_pool.py
+# Connection pool instrumentation. The pool class times every checkout,
+# including the wait for a free connection, so stalls on a busy pool show up
+# in /api/v1/metrics next to the pool's current size and overflow.
+
+import time
+import threading
+from collections import deque
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core import metrics
+
+# Checkout waits kept for the percentiles
+POOL_WAIT_SAMPLES = 1000
+
+
+def _percentile(ordered: list, fraction: float):
+    if not ordered:
+        return None
+    return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+
+class PoolStats:
+    """Checkout counts and wait times of one engine's pool."""
+
+    def __init__(self):
+        self.counters = metrics.Counters("checkouts", "timeouts", "connects", "invalidations")
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=POOL_WAIT_SAMPLES)
+        self._wait_seconds = 0.0
+        self._max_wait = 0.0
+
+    def record_checkout(self, seconds: float):
+        self.counters.increment("checkouts")
+        with self._lock:
+            self._waits.append(seconds)
+            self._wait_seconds += seconds
+            self._max_wait = max(self._max_wait, seconds)
+
+    def record_timeout(self, seconds: float):
+        self.counters.increment("timeouts")
+        with self._lock:
+            self._max_wait = max(self._max_wait, seconds)
+
+    def as_dict(self) -> dict:
+        values = self.counters.as_dict()
+        with self._lock:
+            waits = sorted(self._waits)
+            wait_seconds = self._wait_seconds
+            max_wait = self._max_wait
+        values.update({
+            "avg_wait_ms": round(wait_seconds * 1000 / values["checkouts"], 2) if values["checkouts"] else None,
+            "p50_wait_ms": _percentile(waits, 0.5),
+            "p95_wait_ms": _percentile(waits, 0.95),
+            "p99_wait_ms": _percentile(waits, 0.99),
+            "max_wait_ms": round(max_wait * 1000, 2),
+        })
+        return values
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """The default async queue pool, timing how long each checkout takes."""
+
+    stats: PoolStats = None
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.monotonic() - started)
+            raise
+        self.stats.record_checkout(time.monotonic() - started)
+        return connection
+
+
+def pool_class(stats: PoolStats):
+    """
+    An InstrumentedPool subclass that reports to `stats`, to pass as an
+    engine's poolclass. Pools recreated after a disconnect keep reporting there.
+    """
+    return type("InstrumentedPool", (InstrumentedPool,), {"stats": stats})
+
+
+def register(name: str, engine, stats: PoolStats):
+    """Counts new and invalidated connections of the engine and reports its pool under `name`."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        stats.counters.increment("connects")
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        stats.counters.increment("invalidations")
+
+    def collect() -> dict:
+        # The engine's pool is replaced when it is recreated, so look it up on every read
+        pool = sync_engine.pool
+        values = stats.as_dict()
+        values.update({
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # overflow() counts down from -size while the pool is still filling up
+            "overflow": max(pool.overflow(), 0),
+        })
+        return values
+
+    metrics.register(name, collect)
@@ -0,0 +1,48 @@
+# In app/core/http_client.py
+# The process-wide HTTP client for outbound fetches (e.g. files in Supabase
+# Storage). Connections are kept alive and reused, over HTTP/2 when the
+# server supports it, instead of a new TCP and TLS handshake per request.
+
+import os
+import httpx
+
+HTTP_CLIENT_HTTP2 = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "100"))
+HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_CLIENT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "30"))
+
+try:
+    import h2  # noqa: F401 - needed by httpx for HTTP/2
+except ImportError:
+    HTTP_CLIENT_HTTP2 = False
+
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the shared client, creating it if the app has not started it (e.g. in scripts)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP_CLIENT_HTTP2,
+            limits=httpx.Limits(
+                max_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            timeout=httpx.Timeout(HTTP_CLIENT_TIMEOUT_SECONDS, connect=HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS)
+        )
+    return _client
+
+
+async def start():
+    get_client()
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
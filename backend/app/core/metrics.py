@@ -0,0 +1,37 @@
+# In app/core/metrics.py
+# A small registry of in-process metrics. Each subsystem registers a function that
+# returns a dict of its current counters, and /api/v1/metrics reports them all.
+# Counters are per worker process.
+import threading
+
+_sources = {}
+_lock = threading.Lock()
+
+
+def register(name: str, collect):
+    """Registers `collect()` to report the metrics of one subsystem under `name`."""
+    with _lock:
+        _sources[name] = collect
+
+
+def snapshot() -> dict:
+    """Returns the current metrics of every registered subsystem."""
+    with _lock:
+        sources = dict(_sources)
+    return {name: collect() for name, collect in sources.items()}
+
+
+class Counters:
+    """A thread-safe set of named integer counters."""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._values = {name: 0 for name in names}
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self._values)
@@ -0,0 +1,46 @@
+# In app/core/singleflight.py
+# Coalesces concurrent calls for the same piece of work: while one call for a
+# key is running, later callers with the same key wait for its result instead
+# of repeating the work. Coalescing is per worker process.
+
+import asyncio
+
+from app.core import metrics
+
+
+class SingleFlight:
+    """
+    One group of coalesced work, e.g. 'ocr_analysis', for coroutines on the
+    event loop. Call and coalescing counters are reported under
+    `singleflight.<name>`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks = {}  # key -> asyncio.Task shared with waiting coroutines
+        self._counters = metrics.Counters("calls", "executions", "coalesced", "errors")
+        metrics.register(f"singleflight.{name}", self._counters.as_dict)
+
+    async def do_async(self, key, coro_fn, *args, **kwargs):
+        """
+        Awaits `coro_fn(*args, **kwargs)` unless a call for `key` is already running,
+        then shares its result. The work runs as its own task, so a cancelled
+        caller does not cancel it for the others.
+        """
+        self._counters.increment("calls")
+        task = self._tasks.get(key)
+        if task is None:
+            self._counters.increment("executions")
+            task = asyncio.ensure_future(coro_fn(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._counters.increment("coalesced")
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Retrieving the exception also stops asyncio warning about it when every caller has gone
+        if not task.cancelled() and task.exception() is not None:
+            self._counters.increment("errors")
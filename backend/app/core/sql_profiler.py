@@ -0,0 +1,117 @@
+# In app/core/sql_profiler.py
+# Per-request SQL profiling. Engine events time every statement; the totals of
+# one API request are kept in a context variable set by the middleware in
+# main.py. Slow statements are logged with their route, and so is any
+# statement shape repeated often enough in one request to be an N+1 pattern
+# (e.g. a relationship lazy-loaded inside a loop).
+
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+
+from app.core import metrics
+
+# Statements slower than this are logged
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+# A request running the same statement shape this many times is logged as an N+1 pattern
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+# In debug mode every response carries X-DB-Statements and X-DB-Time-Ms
+SQL_PROFILE_HEADERS = os.getenv("DEBUG", "false").lower() == "true"
+
+_counters = metrics.Counters("statements", "slow_statements", "n_plus_one_requests")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\?(?:::\w+)?(?:\s*,\s*\?(?:::\w+)?)+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with its parameters, literals and IN lists replaced by '?'."""
+    shape = _LITERALS.sub("?", " ".join(statement.split()))
+    return _VALUE_LISTS.sub("?", shape)
+
+
+class RequestProfile:
+    """Statements of one API request, filled in by every statement run while handling it."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    @property
+    def route(self) -> str:
+        # Routing stores the matched route in the scope before the endpoint runs
+        route = self.scope.get("route")
+        path = route.path if route is not None else self.scope.get("path", "unknown")
+        return f"{self.scope.get('method', '')} {path}".strip()
+
+    def headers(self) -> dict:
+        return {
+            "X-DB-Statements": str(self.statements),
+            "X-DB-Time-Ms": str(round(self.seconds * 1000, 1)),
+        }
+
+
+_request_profile: ContextVar = ContextVar("sql_request_profile", default=None)
+
+
+def start_request(scope: dict) -> RequestProfile:
+    """Starts profiling the statements of the current request (called by the middleware)."""
+    profile = RequestProfile(scope)
+    _request_profile.set(profile)
+    return profile
+
+
+def finish_request(profile: RequestProfile):
+    """
+    Logs the statement shapes the request repeated at least SQL_N_PLUS_ONE_THRESHOLD
+    times. Statements of background tasks, which run after the response, are not included.
+    """
+    repeated = [(shape, count) for shape, count in profile.shapes.items() if count >= SQL_N_PLUS_ONE_THRESHOLD]
+    if not repeated:
+        return
+    _counters.increment("n_plus_one_requests")
+    for shape, count in repeated:
+        print(f"Possible N+1 in {profile.route}: {count} times {shape[:300]}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_profiler_started", []).append(time.monotonic())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.monotonic() - conn.info["sql_profiler_started"].pop()
+    _counters.increment("statements")
+
+    profile = _request_profile.get()
+    if profile is not None:
+        profile.statements += 1
+        profile.seconds += seconds
+        profile.shapes[statement_shape(statement)] += 1
+
+    if seconds * 1000 >= SQL_SLOW_QUERY_MS:
+        _counters.increment("slow_statements")
+        route = profile.route if profile is not None else "background"
+        print(f"Slow SQL ({seconds * 1000:.0f} ms) in {route}: {' '.join(statement.split())[:500]}")
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("sql_profiler_started"):
+        connection.info["sql_profiler_started"].pop()
+
+
+def install(engine):
+    """Profiles every statement the (async) engine runs."""
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+metrics.register("sql", _counters.as_dict)
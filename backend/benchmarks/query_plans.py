@@ -0,0 +1,207 @@
+# In benchmarks/query_plans.py
+# Query plan regression check for the per-user list queries. Seeds a scratch
+# schema of a local Postgres with a large user base, then runs EXPLAIN ANALYZE
+# on the statements the routers send and fails if one of them is not served by
+# its index (or gets slower than --max-ms).
+#
+# Run from backend/, against a throwaway database (the schema is dropped and recreated):
+#   BENCHMARK_DATABASE_URL=postgresql://postgres@localhost/postgres python -m benchmarks.query_plans
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import hashlib
+import argparse
+
+BENCHMARK_DATABASE_URL = os.getenv("BENCHMARK_DATABASE_URL")
+if not BENCHMARK_DATABASE_URL:
+    sys.exit("Set BENCHMARK_DATABASE_URL to a local Postgres database (a scratch schema is created in it).")
+# app.core.database builds its engine on import; never let that point at the real database
+os.environ["DATABASE_URL"] = BENCHMARK_DATABASE_URL
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import Base, _async_database_url
+from app.api.v1.models import dose_models, file_models, health_metric_models, medicine_models, profile_models, relationship_models
+
+SCHEMA = "query_plan_benchmark"
+MEDICINES = 1000
+
+TABLES = [
+    profile_models.Profile.__table__,
+    medicine_models.Medicine.__table__,
+    medicine_models.UserMedicine.__table__,
+    dose_models.Dose.__table__,
+    health_metric_models.HealthMetric.__table__,
+    file_models.DocumentText.__table__,
+    file_models.File.__table__,
+    relationship_models.UserRelationship.__table__,
+]
+
+# Ids are derived from the row number, so the queries can pick a user without reading one back
+SEED_STATEMENTS = [
+    ("profiles", """
+        INSERT INTO profiles (id, name)
+        SELECT md5('user' || i)::uuid, 'User ' || i FROM generate_series(1, :users) i
+    """),
+    ("medicines", """
+        INSERT INTO medicines (medicine_id, name)
+        SELECT md5('medicine' || i)::uuid, 'Medicine ' || i FROM generate_series(1, :medicines) i
+    """),
+    ("user_medicines", """
+        INSERT INTO user_medicines (id, user_id, medicine_id)
+        SELECT md5('user_medicine' || i)::uuid, md5('user' || (i % :users + 1))::uuid, md5('medicine' || (i % :medicines + 1))::uuid
+        FROM generate_series(1, :rows) i
+    """),
+    ("doses", """
+        INSERT INTO doses (user_medicine_id, dose_time, quantity)
+        SELECT md5('user_medicine' || (i % :rows + 1))::uuid, (time '00:00' + (i % 1440) * interval '1 minute')::timetz, '1 pill'
+        FROM generate_series(1, :rows) i
+    """),
+    ("health_metrics", """
+        INSERT INTO health_metrics (user_id, metric_type, value, unit, "timestamp")
+        SELECT md5('user' || (i % :users + 1))::uuid, 'glucose', (80 + i % 60)::text, 'mg/dL', now() - i * interval '1 minute'
+        FROM generate_series(1, :rows) i
+    """),
+    ("document_texts", """
+        INSERT INTO document_texts (content_hash, codec, compressed_text, text_length)
+        SELECT encode(sha256(('file' || i)::bytea), 'hex'), 'plain', ('file' || i)::bytea, length('file' || i)
+        FROM generate_series(1, :rows) i
+    """),
+    # Processed files carry their content hash, like in production (it keeps uq_files_user_id_file_hash as wide as there)
+    ("files", """
+        INSERT INTO files (user_id, file_url, file_type, file_hash, uploaded_at)
+        SELECT md5('user' || (i % :users + 1))::uuid, 'files/' || i || '.pdf', 'pdf', encode(sha256(('file' || i)::bytea), 'hex'), now() - i * interval '1 minute'
+        FROM generate_series(1, :rows) i
+    """),
+    ("user_relationships", """
+        INSERT INTO user_relationships (user_id, related_user_id, relation, permission)
+        SELECT md5('user' || (i % :users + 1))::uuid, md5('user' || ((i % :users + i / :users + 1) % :users + 1))::uuid, 'family', 'viewer'
+        FROM generate_series(1, :rows) i
+        ON CONFLICT DO NOTHING
+    """),
+]
+
+
+def _seeded_id(name: str) -> uuid.UUID:
+    return uuid.UUID(hashlib.md5(name.encode("utf-8")).hexdigest())
+
+
+def router_queries():
+    """(description, statement, indexes that may serve it) for each per-user list query of the routers."""
+    user_id = _seeded_id("user1")
+    user_medicine_id = _seeded_id("user_medicine1")
+    return [
+        (
+            "GET /medicines",
+            select(medicine_models.UserMedicine).where(medicine_models.UserMedicine.user_id == user_id),
+            ("ix_user_medicines_user_id",),
+        ),
+        (
+            "GET /health_metrics",
+            select(health_metric_models.HealthMetric)
+            .where(health_metric_models.HealthMetric.user_id == user_id)
+            .order_by(health_metric_models.HealthMetric.timestamp.desc()),
+            ("ix_health_metrics_user_id_timestamp",),
+        ),
+        (
+            "GET /files",
+            select(file_models.File)
+            .where(file_models.File.user_id == user_id)
+            .order_by(file_models.File.uploaded_at.desc()),
+            ("ix_files_user_id_uploaded_at",),
+        ),
+        (
+            "GET /doses/for-medicine/{id}",
+            select(dose_models.Dose)
+            .where(dose_models.Dose.user_medicine_id == user_medicine_id)
+            .order_by(dose_models.Dose.dose_time),
+            ("ix_doses_user_medicine_id_dose_time",),
+        ),
+        (
+            "GET /relationships",
+            select(relationship_models.UserRelationship).where(relationship_models.UserRelationship.user_id == user_id),
+            ("_user_related_user_uc",),
+        ),
+        (
+            "relationships of the user (reverse)",
+            select(relationship_models.UserRelationship).where(relationship_models.UserRelationship.related_user_id == user_id),
+            ("ix_user_relationships_related_user_id",),
+        ),
+    ]
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def seed(engine, rows: int):
+    users = max(rows // 100, 1)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    for table, statement in SEED_STATEMENTS:
+        started = time.monotonic()
+        async with engine.begin() as conn:
+            await conn.execute(text(statement), {"rows": rows, "users": users, "medicines": MEDICINES})
+        print(f"Seeded {table} in {time.monotonic() - started:.1f}s")
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+
+
+async def check_plans(engine, max_ms: float) -> bool:
+    passed = True
+    async with engine.connect() as conn:
+        for description, statement, index_names in router_queries():
+            sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+            plan = (await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"))).scalar_one()[0]
+            nodes = list(_plan_nodes(plan["Plan"]))
+            indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+            seq_scans = {node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"}
+            execution_ms = plan["Execution Time"]
+
+            problems = []
+            if not indexes.intersection(index_names):
+                problems.append(f"does not use {' or '.join(index_names)} (uses {', '.join(sorted(indexes)) or 'no index'})")
+            if seq_scans:
+                problems.append(f"scans {', '.join(sorted(seq_scans))} sequentially")
+            if execution_ms > max_ms:
+                problems.append(f"took {execution_ms:.1f} ms (limit {max_ms} ms)")
+
+            status = "FAIL" if problems else "ok"
+            print(f"{status:4} {description:40} {execution_ms:8.2f} ms  {'; '.join(problems)}")
+            passed = passed and not problems
+    return passed
+
+
+async def main(rows: int, max_ms: float, keep: bool, skip_seed: bool):
+    url, connect_args = _async_database_url(BENCHMARK_DATABASE_URL)
+    connect_args["server_settings"] = {"search_path": SCHEMA}
+    engine = create_async_engine(url, connect_args=connect_args)
+    try:
+        if not skip_seed:
+            await seed(engine, rows)
+        passed = await check_plans(engine, max_ms)
+        if not keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    finally:
+        await engine.dispose()
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks that the per-user list queries use their indexes.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per table (users are rows / 100)")
+    parser.add_argument("--max-ms", type=float, default=50.0, help="slowest acceptable execution time per query")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded schema for another run")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the schema kept by an earlier run")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.rows, args.max_ms, args.keep, args.skip_seed)) else 1)
@@ -1,10 +1,53 @@
 # In app/main.py
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 # Use relative imports for files within the same 'app' package
-from app.api.v1.routers import profiles, medicines, relationships, files, health_metrics,doses
+from app.api.v1.routers import profiles, medicines, relationships, files, health_metrics,doses, metrics
+from app.core import database, http_client, sql_profiler
+from app.core.database import engine, replica_engine
 from AI.routers import ai, files_ai, general_chat # We will integrate the AI router correctly
+from AI.services import file_jobs, llm_metrics, text_extraction
 
-app = FastAPI(title="Medi Help API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    # Background workers for file processing jobs
+    await file_jobs.start()
+    yield
+    await file_jobs.stop()
+    text_extraction.shutdown()
+    await http_client.close()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+app = FastAPI(title="Medi Help API", lifespan=lifespan)
+
+@app.middleware("http")
+async def add_llm_usage_headers(request: Request, call_next):
+    # Streamed replies send their headers before the AI call, so they only report earlier calls
+    usage = llm_metrics.start_request(request.scope)
+    response = await call_next(request)
+    if usage.calls:
+        response.headers.update(usage.headers())
+    return response
+
+@app.middleware("http")
+async def profile_sql(request: Request, call_next):
+    # Counts the statements of the request and logs N+1 patterns; the headers are only sent in debug mode
+    profile = sql_profiler.start_request(request.scope)
+    response = await call_next(request)
+    sql_profiler.finish_request(profile)
+    if sql_profiler.SQL_PROFILE_HEADERS:
+        response.headers.update(profile.headers())
+    return response
+
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    # A client that just wrote keeps reading from the primary, whichever worker serves it
+    response = await call_next(request)
+    database.pin_client(request, response)
+    return response
 
 # Include all the routers
 app.include_router(profiles.router, prefix="/api/v1/profiles", tags=["Profiles"])
@@ -16,6 +59,7 @@ app.include_router(ai.router, prefix="/api/v1/ai", tags=["AI"])
 app.include_router(files_ai.router, prefix="/api/v1/ai/files", tags=["AI File Processing"])
 app.include_router(general_chat.router, prefix="/api/v1/ai/general-chat", tags=["AI General Chat"])
 app.include_router(doses.router, prefix="/api/v1/doses", tags=["Doses"])
+app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["Metrics"])
 
 @app.get("/")
 def read_root():
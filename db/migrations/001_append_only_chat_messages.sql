@@ -0,0 +1,43 @@
+-- Append-only chat message storage.
+-- Each chat turn inserts its new rows into chat_messages instead of rewriting
+-- the whole JSONB history on ai_chat_histories / general_chat_histories.
+-- Conversations that are not moved here are migrated lazily on first read.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    conversation_id UUID NOT NULL,  -- history_id of ai_chat_histories or general_chat_histories
+    seq INTEGER NOT NULL,           -- position within the conversation, starting at 0
+    role TEXT NOT NULL,             -- 'user' or 'model'
+    parts JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (conversation_id, seq)
+);
+
+ALTER TABLE ai_chat_histories ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE ai_chat_histories ALTER COLUMN history SET DEFAULT '[]'::jsonb;
+ALTER TABLE general_chat_histories ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE general_chat_histories ALTER COLUMN history SET DEFAULT '[]'::jsonb;
+
+-- Move the existing JSONB blobs into rows
+INSERT INTO chat_messages (conversation_id, seq, role, parts)
+SELECT h.history_id, m.ordinality - 1, m.value->>'role', m.value->'parts'
+FROM ai_chat_histories h, jsonb_array_elements(h.history) WITH ORDINALITY AS m
+WHERE h.message_count = 0
+ON CONFLICT DO NOTHING;
+
+UPDATE ai_chat_histories
+SET message_count = jsonb_array_length(history), history = '[]'::jsonb
+WHERE message_count = 0 AND jsonb_array_length(history) > 0;
+
+INSERT INTO chat_messages (conversation_id, seq, role, parts)
+SELECT h.history_id, m.ordinality - 1, m.value->>'role', m.value->'parts'
+FROM general_chat_histories h, jsonb_array_elements(h.history) WITH ORDINALITY AS m
+WHERE h.message_count = 0
+ON CONFLICT DO NOTHING;
+
+UPDATE general_chat_histories
+SET message_count = jsonb_array_length(history), history = '[]'::jsonb
+WHERE message_count = 0 AND jsonb_array_length(history) > 0;
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Running summary for bounded chat context windows.
+-- Messages that slide out of the window are folded into `summary`;
+-- `summarized_count` messages (after the pinned system prompt) are covered by it.
+
+BEGIN;
+
+ALTER TABLE ai_chat_histories ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE ai_chat_histories ADD COLUMN IF NOT EXISTS summarized_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE ai_chat_histories ADD COLUMN IF NOT EXISTS summarized_tokens INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE general_chat_histories ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE general_chat_histories ADD COLUMN IF NOT EXISTS summarized_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE general_chat_histories ADD COLUMN IF NOT EXISTS summarized_tokens INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Persistent tier of the OCR analysis cache, keyed by the SHA-256 of the
+-- normalized OCR text. Expired rows are ignored on read and purged periodically.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ocr_analysis_cache (
+    text_hash TEXT PRIMARY KEY,
+    result JSONB NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_ocr_analysis_cache_expires_at ON ocr_analysis_cache (expires_at);
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Lexical index over the extracted text of each file, used to send only the
+-- most relevant passages to the AI in chat-with-file. Files processed before
+-- this migration get their index built on first use.
+
+BEGIN;
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS text_index JSONB;
+
+COMMIT;
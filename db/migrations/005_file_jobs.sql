@@ -0,0 +1,22 @@
+-- Background jobs for file processing. POST /process-file only records a job;
+-- a bounded pool of workers downloads and extracts the file, and clients poll
+-- the job for its progress and result. Unfinished jobs are resumed on startup.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS file_jobs (
+    job_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES profiles(id),
+    request JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    file_id UUID REFERENCES files(file_id),
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_file_jobs_status ON file_jobs (status);
+
+COMMIT;
@@ -0,0 +1,69 @@
+-- Extracted text moves from files into document_texts, one compressed row per
+-- file content hash shared by every user who uploaded that content. files
+-- keeps one row per user and content, so file_hash is unique per user only.
+-- Texts are copied over uncompressed (codec 'plain'); compress them afterwards
+-- with: python -m AI.services.document_store
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS document_texts (
+    content_hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    compressed_text BYTEA NOT NULL,
+    text_length INTEGER NOT NULL,
+    text_index JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- file_hash was unique across all users (through the unique index
+-- ix_files_file_hash, or the files_file_hash_key constraint); from here on it
+-- is unique per user
+ALTER TABLE files DROP CONSTRAINT IF EXISTS files_file_hash_key;
+DROP INDEX IF EXISTS ix_files_file_hash;
+
+-- Files without text were never processed
+UPDATE files SET file_hash = NULL WHERE extracted_text IS NULL;
+
+-- The existing hashes came from the client and were never checked against the
+-- content, so their texts are keyed per user ('legacy:<user_id>:<hash>', see
+-- document_store.legacy_hash): no hash computed by the server matches them,
+-- so they are never shared with another user.
+UPDATE files
+SET file_hash = 'legacy:' || user_id || ':' || file_hash
+WHERE file_hash IS NOT NULL;
+
+-- Files processed without a hash are keyed by the hash of their text. A user
+-- may have several such files with the same text; only the oldest is keyed
+-- (file_hash is unique per user), the others stay unprocessed (NULL) rather
+-- than being deleted, since each has its own stored file. The text itself is
+-- kept through the oldest one.
+UPDATE files
+SET file_hash = keyed.text_hash
+FROM (
+    SELECT file_id, text_hash, row_number() OVER (PARTITION BY text_hash ORDER BY uploaded_at, file_id) AS rank
+    FROM (
+        SELECT file_id, uploaded_at,
+            'legacy:' || user_id || ':text:' || encode(sha256(convert_to(extracted_text, 'UTF8')), 'hex') AS text_hash
+        FROM files
+        WHERE file_hash IS NULL AND extracted_text IS NOT NULL
+    ) unkeyed
+) keyed
+WHERE files.file_id = keyed.file_id AND keyed.rank = 1;
+
+INSERT INTO document_texts (content_hash, codec, compressed_text, text_length, text_index)
+SELECT DISTINCT ON (file_hash)
+    file_hash, 'plain', convert_to(extracted_text, 'UTF8'), char_length(extracted_text), text_index
+FROM files
+WHERE file_hash IS NOT NULL AND extracted_text IS NOT NULL
+ORDER BY file_hash, uploaded_at
+ON CONFLICT (content_hash) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS ix_files_file_hash ON files (file_hash);
+ALTER TABLE files ADD CONSTRAINT uq_files_user_id_file_hash UNIQUE (user_id, file_hash);
+ALTER TABLE files ADD CONSTRAINT files_file_hash_fkey
+    FOREIGN KEY (file_hash) REFERENCES document_texts (content_hash);
+
+ALTER TABLE files DROP COLUMN IF EXISTS extracted_text;
+ALTER TABLE files DROP COLUMN IF EXISTS text_index;
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Full-text search over processed documents (GET /api/v1/files/search).
+-- Vectors of documents stored uncompressed by migration 006 are built here;
+-- compressed ones are filled in by: python -m AI.services.document_store
+
+BEGIN;
+
+ALTER TABLE document_texts ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+UPDATE document_texts
+SET search_vector = to_tsvector('english', left(convert_from(compressed_text, 'UTF8'), 200000))
+WHERE codec = 'plain' AND search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_document_texts_search_vector ON document_texts USING GIN (search_vector);
+
+COMMIT;
@@ -0,0 +1,16 @@
+-- Indexes for the per-user list queries, which filter by user (or by the
+-- user's medicine) and sort by time. Built CONCURRENTLY so the tables stay
+-- writable; that cannot run inside a transaction, so there is no BEGIN/COMMIT
+-- here and each statement commits on its own (e.g. psql -f).
+-- If a build fails it leaves an INVALID index: DROP INDEX CONCURRENTLY it and rerun.
+-- Check the plans with: python -m benchmarks.query_plans (from backend/)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_medicines_user_id ON user_medicines (user_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_health_metrics_user_id_timestamp ON health_metrics (user_id, "timestamp" DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_files_user_id_uploaded_at ON files (user_id, uploaded_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_doses_user_medicine_id_dose_time ON doses (user_medicine_id, dose_time);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_relationships_related_user_id ON user_relationships (related_user_id);
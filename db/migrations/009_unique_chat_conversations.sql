@@ -0,0 +1,44 @@
+-- One conversation per user and medicine (ai_chat_histories) and per user
+-- (general_chat_histories). Conversations are created before the reply is
+-- sent and concurrent first messages rely on these constraints to share one.
+-- Duplicates left by earlier concurrent first messages are removed first,
+-- keeping the longest conversation of each owner (the oldest on a tie).
+
+BEGIN;
+
+CREATE TEMPORARY TABLE duplicate_conversations ON COMMIT DROP AS
+SELECT history_id FROM (
+    SELECT history_id, row_number() OVER (
+        PARTITION BY user_id, medicine_id
+        ORDER BY greatest(message_count, jsonb_array_length(history)) DESC, created_at, history_id
+    ) AS rank
+    FROM ai_chat_histories
+) ranked
+WHERE rank > 1
+UNION ALL
+SELECT history_id FROM (
+    SELECT history_id, row_number() OVER (
+        PARTITION BY user_id
+        ORDER BY greatest(message_count, jsonb_array_length(history)) DESC, created_at, history_id
+    ) AS rank
+    FROM general_chat_histories
+) ranked
+WHERE rank > 1;
+
+DELETE FROM chat_messages WHERE conversation_id IN (SELECT history_id FROM duplicate_conversations);
+DELETE FROM ai_chat_histories WHERE history_id IN (SELECT history_id FROM duplicate_conversations);
+DELETE FROM general_chat_histories WHERE history_id IN (SELECT history_id FROM duplicate_conversations);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_ai_chat_histories_user_id_medicine_id') THEN
+        ALTER TABLE ai_chat_histories
+            ADD CONSTRAINT uq_ai_chat_histories_user_id_medicine_id UNIQUE (user_id, medicine_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_general_chat_histories_user_id') THEN
+        ALTER TABLE general_chat_histories
+            ADD CONSTRAINT uq_general_chat_histories_user_id UNIQUE (user_id);
+    END IF;
+END $$;
+
+COMMIT;